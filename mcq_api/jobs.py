@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MCQ_MAX_CONCURRENT_JOBS", "2"))
+CPU_WORKERS = int(os.getenv("MCQ_CPU_WORKERS", "1"))
+# "thread" keeps the single shared model; "process" isolates CPU work in worker
+# processes, each of which loads its own copy of the model.
+CPU_EXECUTOR = os.getenv("MCQ_CPU_EXECUTOR", "thread")
+LLM_WORKERS = int(os.getenv("MCQ_LLM_WORKERS", "4"))
+FINISHED_JOB_TTL_SECONDS = int(os.getenv("MCQ_FINISHED_JOB_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobConflict(Exception):
+    # A job for the same key is already running with different options.
+    def __init__(self, job):
+        super().__init__(f"Job {job.job_id} is already running for {job.key} with options {job.options}")
+        self.job = job
+
+
+class Job:
+    def __init__(self, key, options=None):
+        self.job_id = str(uuid.uuid4())
+        self.key = key
+        self.options = options or {}
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.results = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.trace = None
+        # Append-only event log behind GET /jobs/{id}/events; an event's id is its
+        # index, so a reconnecting client resumes from Last-Event-ID + 1.
+        self.events = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _emit(self, event, data):
+        # Caller holds self._lock.
+        self.events.append({"id": len(self.events), "event": event, "data": data})
+        self._changed.notify_all()
+
+    def emit(self, event, **data):
+        with self._lock:
+            self._emit(event, data)
+
+    def set_stage(self, stage, progress=None):
+        with self._lock:
+            self.stage = stage
+            if progress is not None:
+                self.progress = progress
+            self._emit("stage", {"stage": stage, "progress": round(self.progress, 3)})
+
+    def set_progress(self, progress, **details):
+        with self._lock:
+            self.progress = progress
+            self._emit("progress", dict(details, stage=self.stage, progress=round(progress, 3)))
+
+    def add_result(self, item, **details):
+        with self._lock:
+            self.results.append(item)
+            self._emit("mcq", dict(details, mcq=item))
+
+    def finish(self, status, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            if status == SUCCEEDED:
+                self.progress = 1.0
+            self.finished_at = time.time()
+            self.status = status
+            self._emit("done" if status == SUCCEEDED else "failed", {"result": result, "error": error})
+
+    def wait_events(self, cursor, timeout=None):
+        # Returns the events from index `cursor` on, blocking up to `timeout`
+        # seconds while there are none yet and the job is still running.
+        with self._changed:
+            if cursor >= len(self.events) and not self.finished:
+                self._changed.wait(timeout)
+            return self.events[cursor:]
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "key": self.key,
+                "options": self.options,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": round(self.progress, 3),
+                "partial_results": list(self.results),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    def __init__(
+        self,
+        max_jobs=MAX_CONCURRENT_JOBS,
+        cpu_workers=CPU_WORKERS,
+        cpu_executor=CPU_EXECUTOR,
+        llm_workers=LLM_WORKERS,
+    ):
+        self._jobs = {}
+        self._active_by_key = {}
+        self._lock = threading.Lock()
+        self._max_jobs = max_jobs
+        self._cpu_workers = cpu_workers
+        self._cpu_executor = cpu_executor
+        self._llm_workers = llm_workers
+        # The executors are created by start(), not here: mcq_api.serve imports
+        # this module in the parent and then forks, and a process pool's queues
+        # and manager thread do not survive a fork.
+        self._runner = None
+        self.cpu_pool = None
+        self.llm_pool = None
+
+    def start(self):
+        # Called from the app's startup hook, i.e. inside each worker process.
+        with self._lock:
+            if self._runner is not None:
+                return
+            self._runner = ThreadPoolExecutor(max_workers=self._max_jobs, thread_name_prefix="mcq-job")
+            if self._cpu_executor == "process":
+                self.cpu_pool = ProcessPoolExecutor(max_workers=self._cpu_workers)
+            else:
+                self.cpu_pool = ThreadPoolExecutor(max_workers=self._cpu_workers, thread_name_prefix="mcq-cpu")
+            self.llm_pool = ThreadPoolExecutor(max_workers=self._llm_workers, thread_name_prefix="mcq-llm")
+
+    def submit(self, key, fn, *args, options=None, **kwargs):
+        # Returns (job, created). A second submission for a key that still has a
+        # queued or running job gets the existing job back instead of a new one,
+        # provided it asks for the same options; otherwise JobConflict is raised
+        # rather than silently dropping them.
+        with self._lock:
+            self._forget_expired()
+            active_id = self._active_by_key.get(key)
+            if active_id is not None:
+                active = self._jobs[active_id]
+                if active.options != (options or {}):
+                    raise JobConflict(active)
+                return active, False
+
+            job = Job(key, options)
+            self._jobs[job.job_id] = job
+            self._active_by_key[key] = job.job_id
+
+        self.start()
+        self._runner.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.finish(SUCCEEDED, result=fn(job, *args, **kwargs))
+        except Exception as e:
+            print(f"Job {job.job_id} failed: {e}")
+            job.finish(FAILED, error=str(e))
+        with self._lock:
+            if self._active_by_key.get(job.key) == job.job_id:
+                del self._active_by_key[job.key]
+
+    def _forget_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > FINISHED_JOB_TTL_SECONDS
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._active_by_key)
+
+    def shutdown(self):
+        if self._runner is None:
+            return
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+        self.llm_pool.shutdown(wait=False, cancel_futures=True)
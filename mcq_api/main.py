@@ -1,9 +1,22 @@
-from fastapi import FastAPI, Form
-import mysql.connector
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Form, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
 import os
+import threading
+from typing import Optional
 from dotenv import load_dotenv
+from mcq_api.jobs import JobConflict, JobManager
+from mcq_api.repository import QuizRepository, create_mysql_pool
+from mcq_generation.metrics import (
+    JOBS_IN_FLIGHT, REGISTRY, STARTUP_SECONDS, Trace, register_cache, span, submit_in_context, use_trace,
+)
 
 app = FastAPI()
+job_manager = JobManager()
 load_dotenv()
 
 MYSQL_HOST = os.getenv("MYSQL_HOST")
@@ -11,91 +24,335 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DB = os.getenv("MYSQL_DB")
 BASE_DIR = os.getenv("UPLOAD_DIR")
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+# Seconds a request or job waits for a free pooled connection before failing.
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "30"))
+# "background" starts serving at once and flips /ready when the models are loaded;
+# "blocking" finishes warm-up before uvicorn accepts connections.
+WARMUP_MODE = os.getenv("MCQ_WARMUP", "background")
+SSE_KEEPALIVE_SECONDS = float(os.getenv("MCQ_SSE_KEEPALIVE", "15"))
+
+repository = None
+
+# Startup phases in seconds. mcq_api.serve fills in "preload" before forking, and
+# the workers inherit it along with the already loaded models.
+startup = {"ready": False, "error": None, "timings": {}}
+
+
+def _record_startup(phase, seconds):
+    startup["timings"][phase] = round(seconds, 3)
+    STARTUP_SECONDS.set(seconds, phase=phase)
+
+
+@app.on_event("startup")
+def connect_db():
+    global repository
+    pool = create_mysql_pool(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, pool_size=MYSQL_POOL_SIZE)
+    repository = QuizRepository.from_pool(pool, checkout_timeout=MYSQL_POOL_TIMEOUT)
+
+
+@app.on_event("startup")
+def start_jobs():
+    job_manager.start()
+
+
+@app.on_event("startup")
+def register_metrics():
+    from mcq_generation.chunk_cache import get_chunk_cache
+    from mcq_generation.llm_cache import get_response_cache
+
+    chunk_cache = get_chunk_cache()
+    llm_cache = get_response_cache()
+    JOBS_IN_FLIGHT.set_function(job_manager.in_flight)
+    register_cache("chunk", lambda: {"hits": chunk_cache.hits, "misses": chunk_cache.misses})
+    register_cache("llm", lambda: {"hits": llm_cache.hits, "misses": llm_cache.misses})
+
+
+def _warm_up():
+    from mcq_generation import mcq_gen, model_registry
+
+    try:
+        start = time.perf_counter()
+        metrics = model_registry.warm_up()
+        _record_startup("models", time.perf_counter() - start)
+        start = time.perf_counter()
+        mcq_gen.warm_up()
+        _record_startup("llm", time.perf_counter() - start)
+    except Exception as e:
+        print("Warm-up failed:", e)
+        startup["error"] = str(e)
+        return
+    startup["ready"] = True
+    print("Models warmed up:", metrics, "startup:", startup["timings"])
+
+
+@app.on_event("startup")
+def warm_up_models():
+    if WARMUP_MODE == "blocking":
+        _warm_up()
+    else:
+        threading.Thread(target=_warm_up, name="mcq-warmup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_jobs():
+    job_manager.shutdown()
+
+
+@app.get("/ready")
+def ready():
+    # Readiness probe: 503 until the models, tokenizer and LLM client are loaded.
+    body = {"ready": startup["ready"], "error": startup["error"], "timings": startup["timings"]}
+    return JSONResponse(body, status_code=200 if startup["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/models")
+def model_metrics():
+    from mcq_generation.model_registry import get_metrics
+
+    return get_metrics()
+
+
+@app.get("/metrics/db")
+def db_metrics():
+    return repository.stats()
+
+
+@app.get("/metrics/llm-cache")
+def llm_cache_metrics():
+    from mcq_generation.llm_cache import get_response_cache
+
+    return get_response_cache().stats()
+
+
+@app.get("/metrics/chunk-cache")
+def chunk_cache_metrics():
+    from mcq_generation.chunk_cache import get_chunk_cache
+
+    return get_chunk_cache().stats()
 
 
 def get_file_path(material_id):
 
     print("Looking up material_id:", material_id)
-    conn = mysql.connector.connect(
-        user=MYSQL_USER, password=MYSQL_PASSWORD, host=MYSQL_HOST, database=MYSQL_DB
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT path FROM materials WHERE materialID = %s", (material_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-
-    if result:
-        rel_path = result[0]
+    rel_path = repository.get_material_path(material_id)
+
+    if rel_path:
         filename = os.path.basename(rel_path)
         abs_path = os.path.join(BASE_DIR, filename)
         return abs_path
     return None
 
-def delete_old_quizzes(material_id):
-    conn = mysql.connector.connect(
-        user=MYSQL_USER, password=MYSQL_PASSWORD, host=MYSQL_HOST, database=MYSQL_DB
-    )
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM quizzes WHERE materialID = %s", (material_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+def run_generation(job, material_id, file_path, force=False, fresh=False, trace=False, mode=None):
+    job.trace = Trace(f"generate-mcqs {material_id}") if trace else None
+    with use_trace(job.trace):
+        return _run_generation(job, material_id, file_path, force, fresh, mode)
 
-@app.post("/generate-mcqs/")
-async def generate_mcqs(material_id: str = Form(...)):
-    print("generate_mcqs endpoint called with material_id:", material_id)
-    file_path = get_file_path(material_id)
 
-    if not file_path or not os.path.isfile(file_path):
-        return {"status": "error", "message": f"Material file not found at {file_path}."}
+def _run_generation(job, material_id, file_path, force, fresh, mode):
+    from mcq_generation.pipeline import cluster_records, ingest_files
+    from mcq_generation.llm_executor import run_clusters
+    from mcq_generation.cluster_store import plan_regeneration, save_cluster_mcqs
+    from mcq_generation.dedup import context_vectors, dedup_contexts
+
+    job.set_stage("ingest")
+    with span("ingest", material_id=material_id):
+        chunks, embeddings = submit_in_context(job_manager.cpu_pool, ingest_files, [file_path]).result()
+    job.set_progress(1.0, chunks=len(chunks))
 
-    delete_old_quizzes(material_id)
+    job.set_stage("cluster", 0.0)
+    clusters = submit_in_context(job_manager.cpu_pool, cluster_records, chunks, embeddings, 8).result()
+    clustered_contexts = [cluster["text"] for cluster in clusters]
+    fingerprints, reused, pending = plan_regeneration(material_id, clustered_contexts, force=force)
+    # Near-duplicate contexts, and contexts already covered by a reused question,
+    # are dropped before any LLM call.
+    keep, _, dedup_stats = dedup_contexts(
+        [clustered_contexts[i] for i in pending],
+        embeddings=context_vectors([clusters[i] for i in pending], embeddings),
+        existing_stems=[mcq.get("stem", "") for mcq in reused.values()],
+        mode=mode,
+    )
+    dropped = [(pending[j], reason) for j, reason in dedup_stats["dropped"]]
+    pending = [pending[j] for j in keep]
+    print(f" Reusing {len(reused)} cluster MCQs, generating {len(pending)}, dropped {len(dropped)} duplicates")
+    job.set_progress(
+        1.0, clusters=len(clustered_contexts), reused=len(reused), pending=len(pending), deduplicated=len(dropped),
+    )
+    for i, mcq in reused.items():
+        job.add_result(mcq, cluster=i, reused=True)
+    for i, reason in dropped:
+        job.emit("skip", cluster=i, reason=reason)
+
+    job.set_stage("generate", 0.0)
+    lock = threading.Lock()
+    finished = []
+    failed = set()
+    # Each new MCQ is written to the cluster store before its event goes out, so
+    # it survives a dropped stream or a crash and is reused by the next run. The
+    # quizzes table is still swapped in one transaction at the end.
+    stored = {fingerprints[i]: mcq for i, mcq in reused.items()}
 
-    from mcq_generation.semantic_cluster import retrieve_diverse_chunks
-    from mcq_generation.chunk_files import load_and_split_pdfs
-    from mcq_generation.mcq_gen import generate_mcq
+    def on_error(index, error):
+        with lock:
+            failed.add(index)
+        job.emit("error", cluster=pending[index], error=str(error))
 
-    chunks = load_and_split_pdfs([file_path])
-    clustered_contexts = retrieve_diverse_chunks(chunks, k=8)
-    mcqs = []
-    for context in clustered_contexts:
-        mcq = generate_mcq(context)
+    def on_result(index, mcq):
+        cluster = pending[index]
+        with lock:
+            finished.append(index)
+            completed = len(finished)
+            if mcq:
+                stored[fingerprints[cluster]] = mcq
+                save_cluster_mcqs(material_id, stored)
         if mcq:
-            save_mcq_to_db(mcq, material_id)
-            mcqs.append(mcq)
-    return {"status": "success", "mcqs_generated": len(mcqs)}
-
-def save_mcq_to_db(mcq, material_id):
-    import uuid
-    import random
-    conn = mysql.connector.connect(
-        user=MYSQL_USER, password=MYSQL_PASSWORD, host=MYSQL_HOST, database=MYSQL_DB
-    )
-    cursor = conn.cursor()
-    options = [mcq["key"]] + mcq.get("distractors", [])
-    if len(options) != 4:
-        return
-    random.shuffle(options)
-    correct_index = options.index(mcq["key"])
-    correct_letter = ["A", "B", "C", "D"][correct_index]
-    quiz_id = str(uuid.uuid4())
-    cursor.execute(
-        """
-        INSERT INTO quizzes (quizId, materialID, question, optionA, optionB, optionC, optionD, correctOption)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        (
-            quiz_id,
-            material_id,
-            mcq.get("stem", ""),
-            options[0],
-            options[1],
-            options[2],
-            options[3],
-            correct_letter
+            job.add_result(mcq, cluster=cluster, reused=False)
+        elif index not in failed:
+            job.emit("skip", cluster=cluster, reason="no valid MCQ in the model output")
+        job.set_progress(completed / len(pending), completed=completed, total=len(pending))
+
+    with span("generate", clusters=len(pending)):
+        results = run_clusters(
+            [clustered_contexts[i] for i in pending], executor=job_manager.llm_pool,
+            on_result=on_result, on_error=on_error, fresh=fresh, mode=mode,
+        )
+    by_cluster = dict(reused)
+    by_cluster.update({i: mcq for i, mcq in zip(pending, results) if mcq})
+    mcqs = [by_cluster[i] for i in sorted(by_cluster)]
+    if not mcqs:
+        # Nothing to save (no chunks, or every cluster failed, e.g. during an LLM
+        # outage): fail the job rather than replace the material's quiz with nothing.
+        raise RuntimeError("No MCQs were generated; the existing quiz was left unchanged.")
+
+    job.set_stage("save")
+    saved = repository.replace_quizzes(material_id, mcqs)
+    save_cluster_mcqs(material_id, {fingerprints[i]: mcq for i, mcq in by_cluster.items()})
+
+    return {
+        "mcqs_generated": saved,
+        "reused": len(reused),
+        "generated": len(by_cluster) - len(reused),
+        "deduplicated": len(dropped),
+        "llm_calls_saved": dedup_stats["llm_calls_saved"],
+    }
+
+
+def _submit_generation(material_id, force, fresh, trace, mode):
+    from mcq_generation.config import MCQ_GENERATION_MODE
+    from mcq_generation.mcq_gen import GENERATION_MODES
+
+    if mode and mode not in GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(GENERATION_MODES)}.")
+    file_path = get_file_path(material_id)
+    if not file_path or not os.path.isfile(file_path):
+        return None, False, file_path
+    mode = mode or MCQ_GENERATION_MODE
+    # trace only adds observability, so it does not keep a request from joining.
+    options = {"force": force, "fresh": fresh, "mode": mode}
+    try:
+        job, created = job_manager.submit(
+            material_id, run_generation, material_id, file_path, force, fresh, trace, mode, options=options,
         )
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail={
+            "message": "A generation job with different options is already running for this material.",
+            "job_id": e.job.job_id,
+            "options": e.job.options,
+        })
+    return job, created, file_path
+
+
+def _format_event(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+
+def _event_stream(job, cursor=0):
+    # Plain generator; Starlette runs it in its thread pool, so blocking in
+    # wait_events is fine. Comment lines keep idle proxies from closing the stream.
+    while True:
+        events = job.wait_events(cursor, timeout=SSE_KEEPALIVE_SECONDS)
+        if not events:
+            if job.finished:
+                return
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            yield _format_event(event)
+            cursor = event["id"] + 1
+            if event["event"] in ("done", "failed"):
+                return
+
+
+def _sse_response(job, cursor=0):
+    return StreamingResponse(
+        _event_stream(job, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.job_id},
     )
-    conn.commit()
-    cursor.close()
-    conn.close()
\ No newline at end of file
+
+
+@app.post("/generate-mcqs/")
+def generate_mcqs(
+    material_id: str = Form(...),
+    force: bool = Form(False),
+    fresh: bool = Form(False),
+    trace: bool = Form(False),
+    mode: str = Form(""),
+):
+    print("generate_mcqs endpoint called with material_id:", material_id)
+    job, created, file_path = _submit_generation(material_id, force, fresh, trace, mode)
+    if job is None:
+        return {"status": "error", "message": f"Material file not found at {file_path}."}
+    return {"status": job.status, "job_id": job.job_id, "deduplicated": not created}
+
+
+@app.post("/generate-mcqs/stream")
+def generate_mcqs_stream(
+    material_id: str = Form(...),
+    force: bool = Form(False),
+    fresh: bool = Form(False),
+    trace: bool = Form(False),
+    mode: str = Form(""),
+):
+    # Same job as /generate-mcqs/, answered as server-sent events: stage and
+    # progress updates, then one mcq / skip / error event per cluster as soon as it
+    # is persisted, and a final done or failed event.
+    job, created, file_path = _submit_generation(material_id, force, fresh, trace, mode)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Material file not found at {file_path}.")
+    return _sse_response(job)
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+def get_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    cursor = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    return _sse_response(job, cursor)
+
+
+@app.get("/jobs/{job_id}/trace")
+def get_job_trace(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.trace is None:
+        raise HTTPException(status_code=404, detail="Job was not started with trace=true.")
+    return job.trace.to_dict()
+
+
+_record_startup("import", time.perf_counter() - _import_started)
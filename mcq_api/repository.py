@@ -0,0 +1,132 @@
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+
+from mcq_generation.metrics import DB_ROUND_TRIPS, span
+
+OPTION_LETTERS = ["A", "B", "C", "D"]
+
+
+def quiz_row(mcq, material_id):
+    options = [mcq["key"]] + mcq.get("distractors", [])
+    if len(options) != 4:
+        return None
+    random.shuffle(options)
+    correct_letter = OPTION_LETTERS[options.index(mcq["key"])]
+    return (
+        str(uuid.uuid4()),
+        material_id,
+        mcq.get("stem", ""),
+        options[0],
+        options[1],
+        options[2],
+        options[3],
+        correct_letter,
+    )
+
+
+def create_mysql_pool(host, user, password, database, pool_size=5, pool_name="mcq_api"):
+    from mysql.connector import pooling
+
+    return pooling.MySQLConnectionPool(
+        pool_name=pool_name,
+        pool_size=pool_size,
+        pool_reset_session=True,
+        host=host,
+        user=user,
+        password=password,
+        database=database,
+    )
+
+
+class QuizRepository:
+    """Materials/quizzes access over any DB-API connection factory.
+
+    With a MySQL pool, connections come from pool.get_connection and close()
+    hands them back. A sqlite3.connect factory with placeholder="?" works as a
+    local stand-in. With max_connections, at most that many connections are
+    checked out at once and further callers wait up to checkout_timeout seconds.
+    """
+
+    def __init__(self, connect, placeholder="%s", max_connections=None, checkout_timeout=30.0):
+        self._connect = connect
+        self._placeholder = placeholder
+        self._slots = threading.BoundedSemaphore(max_connections) if max_connections else None
+        self.checkout_timeout = checkout_timeout
+        self._lock = threading.Lock()
+        self.round_trips = 0
+
+    @classmethod
+    def from_pool(cls, pool, **kwargs):
+        # mysql-connector's get_connection raises PoolError at once when every
+        # connection is in use; request and job threads wait for one instead.
+        return cls(pool.get_connection, max_connections=pool.pool_size, **kwargs)
+
+    @contextmanager
+    def _connection(self):
+        if self._slots is not None and not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No database connection became free within {self.checkout_timeout:g}s.")
+        try:
+            conn = self._connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def _sql(self, query):
+        return query.replace("%s", self._placeholder)
+
+    def _count(self, operation, n=1):
+        DB_ROUND_TRIPS.inc(n, operation=operation)
+        with self._lock:
+            self.round_trips += n
+
+    def get_material_path(self, material_id):
+        with span("db.get_material_path"):
+            return self._get_material_path(material_id)
+
+    def _get_material_path(self, material_id):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("SELECT path FROM materials WHERE materialID = %s"), (material_id,))
+            result = cursor.fetchone()
+            cursor.close()
+        self._count("get_material_path")
+        return result[0] if result else None
+
+    def replace_quizzes(self, material_id, mcqs):
+        # Old quizzes are deleted and the new ones bulk-inserted in a single
+        # transaction, so readers never see a half-regenerated quiz.
+        with span("db.replace_quizzes", mcqs=len(mcqs)):
+            return self._replace_quizzes(material_id, mcqs)
+
+    def _replace_quizzes(self, material_id, mcqs):
+        rows = [row for row in (quiz_row(mcq, material_id) for mcq in mcqs) if row]
+        with self._connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(self._sql("DELETE FROM quizzes WHERE materialID = %s"), (material_id,))
+                if rows:
+                    cursor.executemany(
+                        self._sql(
+                            """
+                            INSERT INTO quizzes (quizId, materialID, question, optionA, optionB, optionC, optionD, correctOption)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                            """
+                        ),
+                        rows,
+                    )
+                conn.commit()
+                cursor.close()
+            except Exception:
+                conn.rollback()
+                raise
+        self._count("replace_quizzes", 3 if rows else 2)
+        return len(rows)
+
+    def stats(self):
+        return {"round_trips": self.round_trips}
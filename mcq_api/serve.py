@@ -0,0 +1,111 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
+
+# Preforking server for mcq_api:
+#
+#     python -m mcq_api.serve --workers 4 --port 8000
+#
+# The parent imports the app and loads e5, KeyBERT and the tokenizer once, then
+# forks workers that serve on one shared listening socket. The workers inherit
+# the weights copy-on-write instead of each loading their own copy. Anything that
+# is not fork-safe is created only inside the workers: the Gemini gRPC client and
+# SQLite connections on first use, the MySQL pool and the job executors
+# (including the MCQ_CPU_EXECUTOR=process pool) in the app's startup hooks.
+
+
+def preload():
+    start = time.perf_counter()
+    from mcq_api import main as api
+    from mcq_generation import mcq_gen, model_registry
+
+    model_registry.warm_up()
+    mcq_gen.get_encoding()
+    api._record_startup("preload", time.perf_counter() - start)
+    print(f" Preloaded models in {time.perf_counter() - start:.2f}s")
+    return api.app
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn_worker(app, sock, log_level):
+    pid = os.fork()
+    if pid:
+        return pid
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        import uvicorn
+
+        config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mcq_api from preloaded, forked uvicorn workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MCQ_API_WORKERS", "2")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("Preforking needs os.fork; use `uvicorn mcq_api.main:app` on this platform.")
+
+    app = preload()
+    sock = bind_socket(args.host, args.port)
+    # Everything allocated so far goes into the permanent generation, so the
+    # workers' garbage collector never writes to (and un-shares) those pages.
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(max(1, args.workers)):
+        workers.add(spawn_worker(app, sock, args.log_level))
+    print(f" Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f" Worker {pid} exited with status {status}, restarting")
+            workers.add(spawn_worker(app, sock, args.log_level))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
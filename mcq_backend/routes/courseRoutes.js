@@ -131,6 +131,11 @@ router.post('/materials/:materialId/generate-quiz', verifyToken, authorizeRoles(
     try {
         const form = new FormData();
         form.append('material_id', materialId);
+        form.append('force', req.body && req.body.force ? 'true' : 'false');
+        form.append('fresh', req.body && req.body.fresh ? 'true' : 'false');
+        if (req.body && req.body.mode) {
+            form.append('mode', req.body.mode);
+        }
 
         const response = await axios.post(
             'http://localhost:8000/generate-mcqs/',
@@ -139,11 +144,71 @@ router.post('/materials/:materialId/generate-quiz', verifyToken, authorizeRoles(
         );
         res.json({ status: 'success', fastapi: response.data });
     } catch (error) {
+        if (error.response && error.response.status === 409) {
+            // A job with other options is already running for this material.
+            return res.status(409).json({ status: 'error', ...error.response.data.detail });
+        }
         console.error(error);
         res.status(500).json({ status: 'error', message: 'Failed to generate MCQs.' });
     }
 });
 
+// Jobs carry the generated questions with their answers, so only the roles that
+// may see answer keys can read them, and only through the material they belong to.
+const fetchMaterialJob = async (materialId, jobId) => {
+    const response = await axios.get(`http://localhost:8000/jobs/${encodeURIComponent(jobId)}`);
+    return response.data.key === materialId ? response.data : null;
+};
+
+router.get('/materials/:materialId/generate-quiz/:jobId', verifyToken, authorizeRoles('professor', 'admin'), async (req, res) => {
+    const { materialId, jobId } = req.params;
+    try {
+        const job = await fetchMaterialJob(materialId, jobId);
+        if (!job) {
+            return res.status(404).json({ status: 'error', message: 'Quiz generation job not found.' });
+        }
+        res.json({ status: 'success', job });
+    } catch (error) {
+        if (error.response && error.response.status === 404) {
+            return res.status(404).json({ status: 'error', message: 'Quiz generation job not found.' });
+        }
+        console.error(error);
+        res.status(500).json({ status: 'error', message: 'Failed to fetch quiz generation status.' });
+    }
+});
+
+router.get('/materials/:materialId/generate-quiz/:jobId/events', verifyToken, authorizeRoles('professor', 'admin'), async (req, res) => {
+    const { materialId, jobId } = req.params;
+    try {
+        if (!(await fetchMaterialJob(materialId, jobId))) {
+            return res.status(404).json({ status: 'error', message: 'Quiz generation job not found.' });
+        }
+        const headers = {};
+        if (req.headers['last-event-id']) {
+            headers['Last-Event-ID'] = req.headers['last-event-id'];
+        }
+        const upstream = await axios.get(`http://localhost:8000/jobs/${encodeURIComponent(jobId)}/events`, {
+            headers,
+            responseType: 'stream',
+        });
+        res.set({
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+        });
+        res.flushHeaders();
+        upstream.data.pipe(res);
+        req.on('close', () => upstream.data.destroy());
+    } catch (error) {
+        if (error.response && error.response.status === 404) {
+            return res.status(404).json({ status: 'error', message: 'Quiz generation job not found.' });
+        }
+        console.error(error);
+        res.status(500).json({ status: 'error', message: 'Failed to stream quiz generation events.' });
+    }
+});
+
 router.get('/my-courses/enrollments', verifyToken, authorizeRoles('professor'), async (req, res) => {
     const professorId = req.user.userId;
     try {
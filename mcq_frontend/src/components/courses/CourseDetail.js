@@ -122,12 +122,95 @@ const CourseDetail = () => {
     }
   };
 
+  const pollQuizJob = (materialId, jobId) => {
+    const timer = setInterval(async () => {
+      try {
+        const res = await axios.get(`/courses/materials/${materialId}/generate-quiz/${jobId}`);
+        const { status } = res.data.job;
+        if (status === 'succeeded' || status === 'failed') {
+          clearInterval(timer);
+          if (status === 'succeeded') {
+            toast.success('Quiz generated!');
+          } else {
+            toast.error('Failed to generate quiz');
+          }
+          fetchCourseData();
+        }
+      } catch (error) {
+        clearInterval(timer);
+        console.error('Error polling quiz generation:', error);
+      }
+    }, 3000);
+  };
+
+  // Reads the job's server-sent events so each question shows up as soon as it is
+  // generated. fetch is used instead of EventSource because the stream needs the
+  // Authorization header. Falls back to polling if the stream cannot be opened.
+  const streamQuizJob = async (materialId, jobId) => {
+    let questions = 0;
+    let finished = false;
+    try {
+      const response = await fetch(
+        `${axios.defaults.baseURL}/courses/materials/${materialId}/generate-quiz/${jobId}/events`,
+        { headers: { Authorization: `Bearer ${localStorage.getItem('token')}` } }
+      );
+      if (!response.ok || !response.body) {
+        throw new Error(`Event stream unavailable (${response.status})`);
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        for (const message of messages) {
+          let event = 'message';
+          let data = '';
+          for (const line of message.split('\n')) {
+            if (line.startsWith('event: ')) event = line.slice(7);
+            if (line.startsWith('data: ')) data += line.slice(6);
+          }
+          if (event === 'mcq') {
+            questions += 1;
+            toast.success(`Question ${questions} ready`, { id: `quiz-${jobId}` });
+          } else if (event === 'done') {
+            finished = true;
+            toast.success('Quiz generated!', { id: `quiz-${jobId}` });
+          } else if (event === 'failed') {
+            finished = true;
+            toast.error('Failed to generate quiz', { id: `quiz-${jobId}` });
+          } else if (event === 'stage' && data) {
+            const { stage } = JSON.parse(data);
+            if (questions === 0) toast.loading(`Quiz generation: ${stage}...`, { id: `quiz-${jobId}` });
+          }
+        }
+      }
+      if (finished) {
+        fetchCourseData();
+      } else {
+        pollQuizJob(materialId, jobId);
+      }
+    } catch (error) {
+      console.error('Error streaming quiz generation:', error);
+      pollQuizJob(materialId, jobId);
+    }
+  };
+
   const handleGenerateQuiz = async (materialId) => {
     setGeneratingQuiz(prev => ({ ...prev, [materialId]: true }));
     try {
-      await axios.post(`/courses/materials/${materialId}/generate-quiz`);
+      const res = await axios.post(`/courses/materials/${materialId}/generate-quiz`);
       toast.success('Quiz generation started! This may take a few moments.');
-      setTimeout(fetchCourseData, 3000);
+      const jobId = res.data.fastapi?.job_id;
+      // Job progress includes the answer keys, so students just reload the course.
+      if (jobId && user?.role !== 'student') {
+        streamQuizJob(materialId, jobId);
+      } else {
+        setTimeout(fetchCourseData, 3000);
+      }
     } catch (error) {
       console.error('Error generating quiz:', error);
       toast.error('Failed to generate quiz');
@@ -0,0 +1,327 @@
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from mcq_generation.chunk_cache import file_sha256
+from mcq_generation.cluster_store import context_fingerprint
+from mcq_generation.config import MCQ_GENERATION_MODE
+from mcq_generation.llm_executor import LLM_MAX_CONCURRENCY
+from mcq_generation.metrics import LLM_CALLS, LLM_TOKENS, submit_in_context
+from mcq_generation.uploader import blob_sha256
+
+# Offline generation for whole courses. Files are ingested and clustered on a
+# small pool while earlier files are already generating on the LLM pool. Every
+# MCQ is appended to a JSONL file as soon as it exists, and a checkpoint next to
+# it records finished contexts and files, so a rerun with the same arguments
+# picks up where the last one stopped. Whether a context gets the scenario or
+# the direct prompt is drawn from a generator seeded with --seed and the
+# context's fingerprint: the same run makes the same choices in any order.
+
+CHECKPOINT_VERSION = 1
+
+
+def read_manifest(source):
+    # A directory (every PDF in it), a JSON list of paths or {"path", "material_id"}
+    # objects, or a text file with one path per line. Relative paths in a manifest
+    # are resolved against the manifest's directory.
+    if os.path.isdir(source):
+        return [{"path": path} for path in sorted(glob.glob(os.path.join(source, "*.pdf")))]
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        if source.endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    materials = []
+    for entry in entries:
+        entry = {"path": entry} if isinstance(entry, str) else dict(entry)
+        entry["path"] = os.path.join(base, entry["path"])
+        materials.append(entry)
+    return materials
+
+
+class Checkpoint:
+    # {"done": {context key: "ok" | "empty"}, "files": {material: "done"}}.
+    # Failed contexts are not recorded, so a rerun tries them again.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get("version") != CHECKPOINT_VERSION:
+            state = {"version": CHECKPOINT_VERSION, "done": {}, "files": {}}
+        self.state = state
+
+    def is_done(self, key):
+        return key in self.state["done"]
+
+    def file_done(self, material):
+        return self.state["files"].get(material) == "done"
+
+    def mark(self, key=None, status="ok", material=None):
+        with self._lock:
+            if key is not None:
+                self.state["done"][key] = status
+            if material is not None:
+                self.state["files"][material] = "done"
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+
+
+class JsonlWriter:
+    # Appends one record per line and flushes it to disk before returning.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._repair_tail()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _repair_tail(self):
+        # A crash mid-write leaves a partial last line; cut it off before appending.
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def keys(self):
+        keys = set()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    keys.add(json.loads(line)["context_key"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return keys
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def prompt_style(seed, key, scenario_ratio):
+    return "scenario" if random.Random(f"{seed}:{key}").random() < scenario_ratio else "direct"
+
+
+def apply_prompt_style(style, context):
+    from mcq_generation.mcq_gen import direct_prompt_template, scenario_prompt_template
+
+    template = scenario_prompt_template if style == "scenario" else direct_prompt_template
+    return template.format(context=context)
+
+
+def prepare_material(entry, k):
+    # Ingest, cluster and dedup one file; runs on the ingest pool.
+    from mcq_generation.dedup import context_vectors, dedup_contexts
+    from mcq_generation.pipeline import cluster_records, ingest_files
+
+    started = time.perf_counter()
+    chunks, embeddings = ingest_files([entry["path"]])
+    clusters = cluster_records(chunks, embeddings, k)
+    keep, texts, stats = dedup_contexts(
+        [cluster["text"] for cluster in clusters], embeddings=context_vectors(clusters, embeddings),
+    )
+    return {
+        "contexts": list(zip(keep, texts)),
+        "chunks": len(chunks),
+        "deduplicated": stats["candidates"] - stats["kept"],
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def make_llm(name, latency):
+    from mcq_generation.llm_cache import with_response_cache
+
+    if name == "fake":
+        from mcq_generation.fake_llm import FakeMCQLLM
+
+        return with_response_cache(FakeMCQLLM(latency=latency))
+    if name == "ollama":
+        from langchain_ollama import OllamaLLM
+
+        return with_response_cache(OllamaLLM(model="llama3", temperature=0.2))
+    return None  # generate_mcq's default Gemini model, already cached
+
+
+def run_batch(materials, output, checkpoint, k=8, mode=None, seed=0, scenario_ratio=0.7,
+              ingest_workers=1, llm_concurrency=LLM_MAX_CONCURRENCY, llm=None, limiter=None, fresh=False):
+    from mcq_generation.mcq_gen import generate_mcq
+
+    writer = JsonlWriter(output)
+    written = writer.keys()
+    totals = {
+        "files": 0, "skipped_files": 0, "failed_files": 0, "contexts": 0, "resumed": 0, "deduplicated": 0,
+        "mcqs": 0, "empty": 0, "failed": 0, "ingest_seconds": 0.0,
+    }
+    lock = threading.Lock()
+    calls = LLM_CALLS.total()
+    tokens = LLM_TOKENS.total()
+    started = time.perf_counter()
+
+    ingest_pool = ThreadPoolExecutor(max_workers=max(1, ingest_workers), thread_name_prefix="batch-ingest")
+    llm_pool = ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="batch-llm")
+    # Contexts still generating per material; the file is checkpointed when it reaches 0.
+    remaining = {}
+
+    def finish_one(material):
+        with lock:
+            remaining[material] -= 1
+            done = remaining[material] == 0
+        if done:
+            checkpoint.mark(material=material)
+
+    def generate_one(entry, material, cluster, key, context):
+        style = prompt_style(seed, key, scenario_ratio)
+        try:
+            mcq = generate_mcq(apply_prompt_style(style, context), llm=llm, limiter=limiter, fresh=fresh, mode=mode)
+        except Exception as e:
+            print(f" {os.path.basename(entry['path'])} cluster {cluster} failed: {e}")
+            with lock:
+                totals["failed"] += 1
+            return
+        if mcq:
+            record = dict(mcq, source="cluster", context_key=key, material=material, file=entry["path"],
+                          cluster=cluster, prompt_style=style, mode=mode or MCQ_GENERATION_MODE)
+            if entry.get("material_id") is not None:
+                record["material_id"] = entry["material_id"]
+            writer.write(record)
+        checkpoint.mark(key, "ok" if mcq else "empty")
+        with lock:
+            totals["mcqs" if mcq else "empty"] += 1
+        finish_one(material)
+
+    try:
+        ingests = {}
+        for entry in materials:
+            try:
+                material = blob_sha256(entry["path"]) or file_sha256(entry["path"])
+            except OSError as e:
+                print(f" Skipping {entry['path']}: {e}")
+                totals["failed_files"] += 1
+                continue
+            if checkpoint.file_done(material):
+                totals["skipped_files"] += 1
+                continue
+            ingests[submit_in_context(ingest_pool, prepare_material, entry, k)] = (entry, material)
+
+        generations = []
+        for future in as_completed(ingests):
+            entry, material = ingests[future]
+            try:
+                prepared = future.result()
+            except Exception as e:
+                print(f" Ingest failed for {entry['path']}: {e}")
+                totals["failed_files"] += 1
+                continue
+            todo = []
+            for cluster, context in prepared["contexts"]:
+                key = f"{material}:{context_fingerprint(context)}"
+                if checkpoint.is_done(key) or key in written:
+                    totals["resumed"] += 1
+                else:
+                    todo.append((cluster, key, context))
+            totals["files"] += 1
+            totals["contexts"] += len(prepared["contexts"])
+            totals["deduplicated"] += prepared["deduplicated"]
+            totals["ingest_seconds"] += prepared["seconds"]
+            print(f" {os.path.basename(entry['path'])}: {prepared['chunks']} chunks, "
+                  f"{len(todo)} contexts to generate, {len(prepared['contexts']) - len(todo)} already done")
+            if not todo:
+                checkpoint.mark(material=material)
+                continue
+            remaining[material] = len(todo)
+            generations.extend(
+                submit_in_context(llm_pool, generate_one, entry, material, cluster, key, context)
+                for cluster, key, context in todo
+            )
+        for future in generations:
+            future.result()
+    except KeyboardInterrupt:
+        print(" Interrupted; rerun the same command to resume from the checkpoint.")
+        ingest_pool.shutdown(wait=False, cancel_futures=True)
+        llm_pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        ingest_pool.shutdown(wait=True)
+        llm_pool.shutdown(wait=True)
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = round(elapsed, 3)
+    totals["ingest_seconds"] = round(totals["ingest_seconds"], 3)
+    totals["llm_calls"] = LLM_CALLS.total() - calls
+    totals["tokens"] = LLM_TOKENS.total() - tokens
+    totals["questions_per_minute"] = round(totals["mcqs"] / elapsed * 60, 2) if elapsed else None
+    totals["tokens_per_question"] = round(totals["tokens"] / totals["mcqs"], 1) if totals["mcqs"] else None
+    return totals
+
+
+def print_report(totals):
+    print(f"\n Files: {totals['files']} processed, {totals['skipped_files']} already finished, "
+          f"{totals['failed_files']} failed")
+    print(f" Contexts: {totals['contexts']} ({totals['resumed']} resumed, {totals['deduplicated']} deduplicated)")
+    print(f" MCQs: {totals['mcqs']} written, {totals['empty']} without a valid MCQ, {totals['failed']} failed")
+    print(f" Time: {totals['seconds']:.1f}s wall, {totals['ingest_seconds']:.1f}s ingest")
+    print(f" Throughput: {totals['questions_per_minute'] or 0:.2f} questions/min, "
+          f"{totals['tokens_per_question'] or 0:.0f} tokens/question, {totals['llm_calls']} LLM calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate MCQs for a whole course, resumably.")
+    parser.add_argument("source", help="directory of PDFs, or a manifest (.json list or one path per line)")
+    parser.add_argument("--output", default="generated_mcqs.jsonl")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--k", type=int, default=8, help="clusters per file")
+    parser.add_argument("--mode", choices=["two_pass", "json"], default=None)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the scenario/direct prompt choice")
+    parser.add_argument("--scenario-ratio", type=float, default=0.7)
+    parser.add_argument("--ingest-workers", type=int, default=1)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_MAX_CONCURRENCY)
+    parser.add_argument("--llm", choices=["gemini", "ollama", "fake"], default="gemini")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the fake LLM sleeps per call")
+    parser.add_argument("--fresh", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--restart", action="store_true", help="ignore and overwrite an existing checkpoint/output")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint.json"
+    if args.restart:
+        for path in (args.output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    from mcq_generation.llm_executor import RateLimiter
+
+    materials = read_manifest(args.source)
+    print(f" {len(materials)} materials")
+    limiter = RateLimiter(requests_per_minute=1e9, tokens_per_minute=1e12) if args.llm == "fake" else None
+    totals = run_batch(
+        materials, args.output, Checkpoint(checkpoint_path), k=args.k, mode=args.mode, seed=args.seed,
+        scenario_ratio=args.scenario_ratio, ingest_workers=args.ingest_workers,
+        llm_concurrency=args.llm_concurrency, llm=make_llm(args.llm, args.llm_latency), limiter=limiter,
+        fresh=args.fresh,
+    )
+    print_report(totals)
+    print(f"\n MCQs appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from sklearn.cluster import KMeans
+from sklearn.metrics.pairwise import cosine_similarity
+
+from mcq_generation.semantic_cluster import retrieve_diverse_chunks
+
+CHUNK_COUNTS = [50, 200, 1000, 5000, 20000]
+DIMENSIONS = 1024
+
+
+def make_corpus(n, k, dim=DIMENSIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(k, dim))
+    labels = rng.integers(0, k, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    words = [f"term{i}" for i in range(200)]
+    chunks = [
+        Document(page_content=" ".join(words[(i + j) % 200] for j in range(12 + i % 20)))
+        for i in range(n)
+    ]
+    return chunks, vectors.astype(np.float32)
+
+
+def legacy_retrieve_diverse_chunks(chunks, k, embeddings):
+    # The list-comprehension implementation this module replaced, kept as a baseline.
+    keep = [len(chunk.page_content.split()) > 10 for chunk in chunks]
+    embeddings = embeddings[np.array(keep)]
+    chunks = [chunk for chunk, kept in zip(chunks, keep) if kept]
+    k = min(k, len(chunks))
+    labels = KMeans(n_clusters=k, random_state=42, n_init="auto").fit_predict(embeddings)
+
+    diverse_chunks = []
+    for label in set(labels):
+        cluster_chunks = [chunks[i] for i in range(len(chunks)) if labels[i] == label]
+        cluster_embeds = [embeddings[i] for i in range(len(chunks)) if labels[i] == label]
+        center = np.mean(cluster_embeds, axis=0, keepdims=True)
+        if np.mean(cosine_similarity(cluster_embeds, center)) > 0.55:
+            sims = cosine_similarity(cluster_embeds, center).flatten()
+            merged = "\n\n".join(cluster_chunks[i].page_content for i in np.argsort(sims)[-3:])
+            if merged.strip().isdigit() or len(merged.split()) < 20:
+                continue
+            diverse_chunks.append(merged)
+    return diverse_chunks
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark for cluster selection.")
+    parser.add_argument("--counts", type=int, nargs="+", default=CHUNK_COUNTS)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--skip-legacy-above", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'legacy s':>10} {'kmeans s':>10} {'minibatch s':>12} {'same':>6}")
+    for n in args.counts:
+        chunks, embeddings = make_corpus(n, args.k)
+        new, new_s = timed(retrieve_diverse_chunks, chunks, k=args.k, embeddings=embeddings, minibatch=False)
+        _, mini_s = timed(retrieve_diverse_chunks, chunks, k=args.k, embeddings=embeddings, minibatch=True)
+        if n <= args.skip_legacy_above:
+            old, old_s = timed(legacy_retrieve_diverse_chunks, chunks, args.k, embeddings)
+            same = "yes" if old == new else "NO"
+            old_col = f"{old_s:10.3f}"
+        else:
+            same, old_col = "-", f"{'-':>10}"
+        print(f"{n:>8} {old_col} {new_s:10.3f} {mini_s:12.3f} {same:>6}")
+
+
+if __name__ == "__main__":
+    main()
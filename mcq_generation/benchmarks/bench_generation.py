@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DATA = os.path.join(BENCH_DIR, "..", "example_data")
+OUTCOMES = ["ok", "repaired", "failed"]
+
+
+def load_contexts(args):
+    if args.contexts:
+        with open(args.contexts, encoding="utf-8") as f:
+            return json.load(f)
+    from mcq_generation.pipeline import build_contexts
+
+    pdf_path = args.pdf if os.path.isfile(args.pdf) else os.path.join(EXAMPLE_DATA, args.pdf)
+    return build_contexts([pdf_path], k=args.k)
+
+
+def make_llm(args):
+    if args.llm == "fake":
+        from mcq_generation.fake_llm import FakeMCQLLM
+
+        return FakeMCQLLM(latency=args.llm_latency, malformed_every=args.malformed_every)
+    if args.llm == "ollama":
+        from langchain_ollama import OllamaLLM
+        from mcq_generation.llm_cache import with_response_cache
+
+        # Benchmarks run with fresh=True, so the cache only records answers.
+        return with_response_cache(OllamaLLM(model="llama3", temperature=0.2))
+    from mcq_generation.mcq_gen import get_llm
+
+    return get_llm()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def bench_mode(mode, contexts, llm, limiter):
+    from mcq_generation.mcq_gen import generate_mcq
+    from mcq_generation.metrics import LLM_CALLS, LLM_TOKENS, MCQ_PARSE_OUTCOMES
+
+    calls = LLM_CALLS.total()
+    prompt_tokens = LLM_TOKENS.value(kind="prompt")
+    completion_tokens = LLM_TOKENS.value(kind="completion")
+    outcomes = {outcome: MCQ_PARSE_OUTCOMES.value(mode=mode, outcome=outcome) for outcome in OUTCOMES}
+
+    latencies = []
+    errors = 0
+    # Sequential on purpose: the point is per-question latency, not throughput.
+    # fresh=True bypasses the response cache so every call reaches the model.
+    for context in contexts:
+        start = time.perf_counter()
+        try:
+            generate_mcq(context, llm=llm, limiter=limiter, fresh=True, mode=mode)
+        except Exception as e:
+            print(f"   {mode}: generation failed: {e}")
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    parsed = {outcome: MCQ_PARSE_OUTCOMES.value(mode=mode, outcome=outcome) - outcomes[outcome] for outcome in OUTCOMES}
+    valid = parsed["ok"] + parsed["repaired"]
+    return {
+        "contexts": len(contexts),
+        "valid_mcqs": valid,
+        "parse_success_rate": round(valid / len(contexts), 4) if contexts else None,
+        "outcomes": parsed,
+        "errors": errors,
+        "llm_calls": LLM_CALLS.total() - calls,
+        "prompt_tokens": LLM_TOKENS.value(kind="prompt") - prompt_tokens,
+        "completion_tokens": LLM_TOKENS.value(kind="completion") - completion_tokens,
+        "latency_mean_seconds": round(statistics.mean(latencies), 4) if latencies else None,
+        "latency_p50_seconds": round(percentile(latencies, 0.5), 4) if latencies else None,
+        "latency_p95_seconds": round(percentile(latencies, 0.95), 4) if latencies else None,
+    }
+
+
+def print_summary(results):
+    print(f"\n {'mode':<10} {'valid':>7} {'success':>8} {'calls':>6} {'prompt tok':>11} "
+          f"{'compl tok':>10} {'p50 s':>8} {'p95 s':>8}")
+    for mode, record in results["modes"].items():
+        print(f" {mode:<10} {record['valid_mcqs']:>7} {record['parse_success_rate'] or 0:>8.1%} "
+              f"{record['llm_calls']:>6} {record['prompt_tokens']:>11} {record['completion_tokens']:>10} "
+              f"{record['latency_p50_seconds'] or 0:>8.3f} {record['latency_p95_seconds'] or 0:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the two-pass and single-pass JSON generation modes.")
+    parser.add_argument("--pdf", default="SI_Curs1.pdf", help="PDF to build cluster contexts from")
+    parser.add_argument("--contexts", help="JSON file with a list of context strings (skips ingest)")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["two_pass", "json"])
+    parser.add_argument("--llm", choices=["fake", "gemini", "ollama"], default="fake")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the fake LLM sleeps per call")
+    parser.add_argument("--malformed-every", type=int, default=0,
+                        help="make every n-th fake JSON answer malformed to exercise repair")
+    parser.add_argument("--output", default=os.path.join("bench_results", f"generation-{int(time.time())}.json"))
+    args = parser.parse_args()
+
+    from mcq_generation.llm_executor import RateLimiter
+
+    contexts = load_contexts(args)
+    print(f" {len(contexts)} contexts")
+    llm = make_llm(args)
+    limiter = RateLimiter(requests_per_minute=1e9, tokens_per_minute=1e12) if args.llm == "fake" else None
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "llm": args.llm,
+        "modes": {},
+    }
+    for mode in args.modes:
+        print(f"\n Benchmarking mode {mode}")
+        results["modes"][mode] = bench_mode(mode, contexts, llm, limiter)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\n Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
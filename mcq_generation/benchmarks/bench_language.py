@@ -0,0 +1,96 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DATA = os.path.join(BENCH_DIR, "..", "example_data")
+
+
+def load_chunks(pdf_paths, chunk_chars):
+    # Plain character windows over each page: no embedding model needed, and the
+    # chunk sizes are in the same range as the semantic chunker's.
+    from pypdf import PdfReader
+
+    documents = {}
+    for pdf_path in pdf_paths:
+        texts, pages = [], []
+        for page_number, page in enumerate(PdfReader(pdf_path).pages):
+            text = page.extract_text() or ""
+            for start in range(0, len(text), chunk_chars):
+                texts.append(text[start:start + chunk_chars])
+                pages.append(page_number)
+        documents[os.path.basename(pdf_path)] = (texts, pages)
+    return documents
+
+
+def per_chunk(texts):
+    from mcq_generation.language import detect_language
+
+    return [detect_language(text) for text in texts]
+
+
+def bench_document(texts, pages, repeat):
+    from mcq_generation.language import detect_chunk_languages
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        baseline = per_chunk(texts)
+    baseline_seconds = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        batched, stats = detect_chunk_languages(texts, pages)
+    batched_seconds = (time.perf_counter() - start) / repeat
+
+    agree = sum(a == b for a, b in zip(baseline, batched))
+    return {
+        "chunks": len(texts),
+        "pages": stats["pages"],
+        "document_language": stats["document_language"],
+        "fallback_pages": stats["fallback_pages"],
+        "per_chunk_calls": len(texts),
+        "batched_calls": stats["detector_calls"],
+        "per_chunk_seconds": round(baseline_seconds, 4),
+        "batched_seconds": round(batched_seconds, 4),
+        "speedup": round(baseline_seconds / batched_seconds, 2) if batched_seconds else None,
+        "agreement": round(agree / len(texts), 4) if texts else None,
+        "disagreements": [[i, a, b] for i, (a, b) in enumerate(zip(baseline, batched)) if a != b][:20],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-chunk and batched language detection.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to tag (default: every PDF in example_data)")
+    parser.add_argument("--chunk-chars", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join("bench_results", f"language-{int(time.time())}.json"))
+    args = parser.parse_args()
+
+    pdf_paths = args.pdfs or sorted(glob.glob(os.path.join(EXAMPLE_DATA, "*.pdf")))
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "chunk_chars": args.chunk_chars,
+        "documents": {},
+    }
+    for name, (texts, pages) in load_chunks(pdf_paths, args.chunk_chars).items():
+        print(f" Benchmarking {name} ({len(texts)} chunks)")
+        results["documents"][name] = bench_document(texts, pages, args.repeat)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n {'document':<28} {'chunks':>7} {'calls':>13} {'per-chunk s':>12} {'batched s':>10} {'agree':>7}")
+    for name, record in results["documents"].items():
+        calls = f"{record['per_chunk_calls']}->{record['batched_calls']}"
+        print(f" {name[:28]:<28} {record['chunks']:>7} {calls:>13} {record['per_chunk_seconds']:>12.3f} "
+              f"{record['batched_seconds']:>10.3f} {record['agreement'] or 0:>7.1%}")
+    print(f"\n Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
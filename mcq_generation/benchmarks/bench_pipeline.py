@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DATA = os.path.join(BENCH_DIR, "..", "example_data")
+DEFAULT_PDFS = [
+    "SI_Curs3.pdf",
+    "SI_Curs1.pdf",
+    "NetworkingFundamentals.pdf",
+    "ComputerScienceOne.pdf",
+    "PAM.pdf",
+]
+STAGES = ["pdf_load", "chunk", "language", "embed", "cluster", "topic_label", "index", "llm"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def stage_record(seconds, items):
+    return {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "items_per_second": round(items / seconds, 2) if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_file(pdf_path, k, llm_latency, work_dir):
+    from mcq_generation.chunk_cache import ChunkCache
+    from mcq_generation.chunk_files import load_and_embed_pdfs
+    from mcq_generation.embedder import add_documents, open_vectorstore
+    from mcq_generation.fake_llm import FakeMCQLLM
+    from mcq_generation.llm_executor import RateLimiter, run_clusters
+    from mcq_generation.semantic_cluster import cluster_chunks
+    from mcq_generation.topics import TopicCache, label_clusters
+    from mcq_generation.timing import StageTimings
+
+    stages = {}
+    timings = StageTimings()
+    # A fresh cache directory per file so every run measures a cold ingest.
+    cache = ChunkCache(root=os.path.join(work_dir, "chunk_cache"))
+    chunks, embeddings = load_and_embed_pdfs([pdf_path], cache=cache, timings=timings, workers=1)
+    item_counts = {
+        "pdf_load": timings.counts["pdf_load"],
+        "chunk": len(chunks),
+        "language": len(chunks),
+        "embed": len(chunks),
+    }
+    for name, items in item_counts.items():
+        # With pooled chunk vectors there is no separate embed stage.
+        if name in timings.seconds:
+            stages[name] = stage_record(timings.seconds[name], items)
+
+    start = time.perf_counter()
+    clusters = cluster_chunks(chunks, k=k, embeddings=embeddings)
+    stages["cluster"] = stage_record(time.perf_counter() - start, len(chunks))
+
+    start = time.perf_counter()
+    label_clusters(clusters, material=pdf_path, cache=TopicCache())
+    stages["topic_label"] = stage_record(time.perf_counter() - start, len(clusters))
+
+    start = time.perf_counter()
+    vectorstore = open_vectorstore(pdf_path, persist_directory=os.path.join(work_dir, "vector_store"))
+    add_documents(vectorstore, chunks, embeddings)
+    stages["index"] = stage_record(time.perf_counter() - start, len(chunks))
+
+    llm = FakeMCQLLM(latency=llm_latency)
+    limiter = RateLimiter(requests_per_minute=1e9, tokens_per_minute=1e12)
+    start = time.perf_counter()
+    mcqs = run_clusters([cluster["text"] for cluster in clusters], llm=llm, limiter=limiter)
+    stages["llm"] = stage_record(time.perf_counter() - start, sum(1 for mcq in mcqs if mcq))
+
+    return {"chunks": len(chunks), "clusters": len(clusters), "stages": stages}
+
+
+def run(pdfs, k, llm_latency, output):
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "k": k,
+        "llm_latency": llm_latency,
+        "files": {},
+    }
+
+    start = time.perf_counter()
+    from mcq_generation.model_registry import warm_up
+    warm_up()
+    results["model_load_seconds"] = round(time.perf_counter() - start, 3)
+
+    for pdf in pdfs:
+        pdf_path = pdf if os.path.isfile(pdf) else os.path.join(EXAMPLE_DATA, pdf)
+        print(f"\n Benchmarking {pdf_path}")
+        with tempfile.TemporaryDirectory() as work_dir:
+            results["files"][os.path.basename(pdf_path)] = bench_file(pdf_path, k, llm_latency, work_dir)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\n Results written to {output}")
+    return results
+
+
+def print_summary(results):
+    for name, file_result in results["files"].items():
+        print(f"\n {name}: {file_result['chunks']} chunks, {file_result['clusters']} clusters")
+        for stage in STAGES:
+            record = file_result["stages"].get(stage)
+            if record:
+                print(f"   {stage:<12} {record['seconds']:>9.3f}s  {record['items']:>6} items  "
+                      f"{record['items_per_second'] or 0:>9.1f}/s  peak {record['peak_rss_mb']:>8.1f} MB")
+
+
+def compare(baseline_path, candidate_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(candidate_path, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    regressions = []
+    for name, base_file in baseline["files"].items():
+        new_file = candidate["files"].get(name)
+        if new_file is None:
+            continue
+        print(f"\n {name}")
+        for stage in STAGES:
+            old = base_file["stages"].get(stage)
+            new = new_file["stages"].get(stage)
+            if not old or not new:
+                continue
+            change = (new["seconds"] - old["seconds"]) / old["seconds"] if old["seconds"] else 0.0
+            rss_change = new["peak_rss_mb"] - old["peak_rss_mb"]
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, stage, change))
+            print(f"   {stage:<12} {old['seconds']:>9.3f}s -> {new['seconds']:>9.3f}s "
+                  f"({change:+.1%})  peak RSS {rss_change:+.1f} MB{flag}")
+
+    if regressions:
+        print(f"\n {len(regressions)} stage(s) slower than the {threshold:.0%} threshold")
+        return 1
+    print("\n No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end MCQ pipeline benchmark over example_data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="benchmark the pipeline with a fake LLM")
+    run_parser.add_argument("pdfs", nargs="*", default=DEFAULT_PDFS)
+    run_parser.add_argument("--k", type=int, default=8)
+    run_parser.add_argument("--llm-latency", type=float, default=0.5,
+                            help="seconds the fake LLM sleeps per call")
+    run_parser.add_argument("--output", default=os.path.join("bench_results", f"pipeline-{int(time.time())}.json"))
+
+    compare_parser = subparsers.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown per stage that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args.pdfs, args.k, args.llm_latency, args.output)
+    else:
+        sys.exit(compare(args.baseline, args.candidate, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DATA = os.path.join(BENCH_DIR, "..", "example_data")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def sample_queries(chunks, n, seed):
+    # One sentence (at most 20 words) from each of n random chunks; the chunk it
+    # came from is the relevant one. Lexical by construction, so prefer --queries
+    # with real (e.g. English-about-Romanian) questions when you have them.
+    rng = random.Random(seed)
+    queries = []
+    for i in rng.sample(range(len(chunks)), min(n, len(chunks))):
+        sentences = [s for s in re.split(r"(?<=[.?!])\s+", chunks[i].page_content) if len(s.split()) >= 8]
+        if sentences:
+            queries.append({"query": " ".join(rng.choice(sentences).split()[:20]), "chunks": [i]})
+    return queries
+
+
+def load_queries(path, chunks):
+    # [{"query": ..., "relevant": [substring, ...]}]: every chunk containing one of
+    # the substrings (diacritics and case folded) counts as relevant.
+    from mcq_generation.retrieval import fold
+
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    folded = [fold(chunk.page_content) for chunk in chunks]
+    queries = []
+    for entry in entries:
+        needles = [fold(needle) for needle in entry["relevant"]]
+        relevant = [i for i, text in enumerate(folded) if any(needle in text for needle in needles)]
+        if relevant:
+            queries.append({"query": entry["query"], "chunks": relevant})
+        else:
+            print(f" No chunk matches the relevant text of {entry['query']!r}; skipped")
+    return queries
+
+
+def make_rewriter(name):
+    if name == "none":
+        return None
+    from langchain_core.output_parsers import StrOutputParser
+    from mcq_generation.rag import prompt_rewrite
+
+    if name == "ollama":
+        from langchain_ollama import OllamaLLM
+
+        llm = OllamaLLM(model="llama3", temperature=0.2)
+    else:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.2, max_output_tokens=1024)
+    return prompt_rewrite | llm | StrOutputParser()
+
+
+def run_path(search, queries, position, k):
+    latencies = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        docs = search(query["query"])
+        latencies.append(time.perf_counter() - start)
+        found = {position.get(doc.page_content) for doc in docs[:k]}
+        hits += bool(found & set(query["chunks"]))
+    return {
+        "queries": len(queries),
+        "recall_at_k": round(hits / len(queries), 4) if queries else None,
+        "latency_mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+        "latency_p50_ms": round(1000 * percentile(latencies, 0.5), 3) if latencies else None,
+        "latency_p95_ms": round(1000 * percentile(latencies, 0.95), 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rewrite+MMR retrieval with hybrid BM25+dense retrieval.")
+    parser.add_argument("pdfs", nargs="*", default=["SI_Curs1.pdf", "SI_Curs2.pdf", "SI_Curs3.pdf"])
+    parser.add_argument("--queries", help="JSON list of {query, relevant: [substring, ...]}")
+    parser.add_argument("--sample", type=int, default=50, help="queries sampled from the chunks without --queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rewrite", choices=["none", "gemini", "ollama"], default="none",
+                        help="LLM rewrite in front of the MMR baseline (and of the hybrid path, with --rewrite-hybrid)")
+    parser.add_argument("--rewrite-hybrid", action="store_true")
+    parser.add_argument("--output", default=os.path.join("bench_results", f"retrieval-{int(time.time())}.json"))
+    args = parser.parse_args()
+
+    from mcq_generation.chunk_files import load_and_embed_pdfs
+    from mcq_generation.embedder import material_key, store_embeddings
+    from mcq_generation.retrieval import HybridRetriever
+
+    pdf_paths = [p if os.path.isfile(p) else os.path.join(EXAMPLE_DATA, p) for p in args.pdfs]
+    chunks, embeddings = load_and_embed_pdfs(pdf_paths)
+    vectorstore = store_embeddings(chunks, collection_name=material_key(chunks), embeddings=embeddings)
+    position = {chunk.page_content: i for i, chunk in enumerate(chunks)}
+    queries = load_queries(args.queries, chunks) if args.queries else sample_queries(chunks, args.sample, args.seed)
+    print(f" {len(chunks)} chunks, {len(queries)} queries")
+
+    rewriter = make_rewriter(args.rewrite)
+    mmr = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": args.k, "fetch_k": 20})
+
+    def rewrite_then_mmr(query):
+        return mmr.invoke(rewriter.invoke(query) if rewriter else query)
+
+    start = time.perf_counter()
+    hybrid = HybridRetriever.from_vectorstore(vectorstore, k=args.k)
+    build_seconds = time.perf_counter() - start
+    hybrid_rewriter = rewriter if args.rewrite_hybrid else None
+
+    def search_hybrid(query):
+        return hybrid.invoke(query, rewriter=hybrid_rewriter)
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pdfs": [os.path.basename(p) for p in pdf_paths],
+        "chunks": len(chunks),
+        "k": args.k,
+        "rewrite": args.rewrite,
+        "hybrid_build_seconds": round(build_seconds, 3),
+        "paths": {},
+    }
+    label = "rewrite+mmr" if rewriter else "mmr"
+    print(f" Benchmarking {label}")
+    results["paths"][label] = run_path(rewrite_then_mmr, queries, position, args.k)
+    print(" Benchmarking hybrid (cold)")
+    results["paths"]["hybrid_cold"] = run_path(search_hybrid, queries, position, args.k)
+    # The same questions again: what a repeat student question costs.
+    print(" Benchmarking hybrid (repeat)")
+    results["paths"]["hybrid_repeat"] = run_path(search_hybrid, queries, position, args.k)
+    results["hybrid_cache"] = hybrid.stats()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n {'path':<16} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, record in results["paths"].items():
+        print(f" {name:<16} {record['recall_at_k'] or 0:>9.1%} {record['latency_mean_ms'] or 0:>9.2f} "
+              f"{record['latency_p50_ms'] or 0:>9.2f} {record['latency_p95_ms'] or 0:>9.2f}")
+    print(f"\n Hybrid index built in {build_seconds:.2f}s; results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
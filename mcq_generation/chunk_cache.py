@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from mcq_generation.config import CHUNK_CACHE_DIR, CHUNK_CACHE_MAX_BYTES
+
+CHUNKS_FILE = "chunks.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkCache:
+    """On-disk chunk + embedding store keyed by file content and chunker settings.
+
+    Each entry is a directory holding the chunk texts/metadata as JSON and the
+    embedding matrix as a .npy file that is opened memory-mapped on a hit.
+    Entries are evicted least-recently-used once the cache outgrows max_bytes;
+    an entry larger than max_bytes on its own is not stored.
+    """
+
+    def __init__(self, root: str = CHUNK_CACHE_DIR, max_bytes: int = CHUNK_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_hash: str, params: Dict) -> str:
+        payload = json.dumps({"file": file_hash, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, CHUNKS_FILE), encoding="utf-8") as f:
+                records = json.load(f)
+            embeddings = np.load(os.path.join(entry_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        os.utime(entry_dir)
+        with self._lock:
+            self.hits += 1
+        chunks = [Document(page_content=r["text"], metadata=r["metadata"]) for r in records]
+        return chunks, embeddings
+
+    def put(self, key: str, chunks: List[Document], embeddings: np.ndarray) -> None:
+        records = [{"text": c.page_content, "metadata": c.metadata} for c in chunks]
+        payload = json.dumps(records, ensure_ascii=False).encode("utf-8")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        size = len(payload) + embeddings.nbytes
+        if size > self.max_bytes:
+            # It would be evicted straight away; don't write it at all.
+            with self._lock:
+                self.skipped += 1
+            print(f" Not caching {size} bytes of chunks: larger than the cache ({self.max_bytes} bytes)")
+            return
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        try:
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), "wb") as f:
+                f.write(payload)
+            np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings)
+            try:
+                os.replace(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker stored the same content first; keep theirs.
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, name)
+                if name.endswith(".tmp") or not os.path.isdir(entry_dir):
+                    continue
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir)
+                    )
+                    entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self) -> int:
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, entry_dir in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                removed += 1
+            self.evictions += removed
+            return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "skipped": self.skipped,
+                "entries": len(entries),
+                "size_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "checked_at": time.time(),
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_chunk_cache() -> ChunkCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ChunkCache()
+    return _default_cache
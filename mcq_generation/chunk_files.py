@@ -1,44 +1,278 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader
-from langdetect import detect, LangDetectException
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
+from langchain_core.documents import Document
+from mcq_generation.config import MODEL_NAME, EMBED_BACKEND, EMBED_BATCH_SIZE, INGEST_WORKERS, CHUNK_VECTORS
+from mcq_generation.embedding_engine import PASSAGE_PREFIX
+from mcq_generation.model_registry import get_embeddings
+from mcq_generation.chunk_cache import get_chunk_cache, file_sha256
+from mcq_generation.uploader import blob_sha256
+from mcq_generation.language import tag_languages
+from mcq_generation.ingest_workers import detect_languages, extract_pages
+from mcq_generation.pooled_chunker import PooledSemanticChunker
+from mcq_generation.timing import StageTimings
+import numpy as np
 
-def load_and_split_pdfs(file_paths, chunk_size=1000, chunk_overlap=200):
-    all_chunks= []
+BREAKPOINT_THRESHOLD_TYPE = "interquartile"
+BREAKPOINT_THRESHOLD_AMOUNT = 85
+
+# Bump when chunking or embedding changes in a way that invalidates cached entries.
+CHUNK_CACHE_VERSION = 4
 
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="intfloat/multilingual-e5-large",
-        encode_kwargs = {"normalize_embeddings": True}
-    )
 
-    chunker = SemanticChunker(
-        embeddings=embedding_model,
-        breakpoint_threshold_type="interquartile",
-        breakpoint_threshold_amount=85,
+def _make_chunker():
+    return PooledSemanticChunker(
+        embeddings=get_embeddings(),
+        breakpoint_threshold_type=BREAKPOINT_THRESHOLD_TYPE,
+        breakpoint_threshold_amount=BREAKPOINT_THRESHOLD_AMOUNT,
     )
 
-    for file_path in file_paths:
-     try:
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
 
-        chunks = chunker.split_documents(documents)
+def _tag_languages(chunks, timings):
+    # Languages are tagged once per document (see language.py), after all of its
+    # chunks are known.
+    with timings.stage("language"):
+        tag_languages(chunks)
+
 
+def iter_pages(file_path, timings=None):
+    pages = PyPDFLoader(file_path).lazy_load()
+    return timings.timed_iter("pdf_load", pages) if timings else pages
+
+
+def iter_pdf_chunks(file_path, chunker, timings=None):
+    # SemanticChunker.split_documents splits every page on its own, so chunking one
+    # page at a time as the loader yields it gives the same chunks as loading the
+    # whole PDF first, while only one page is held in memory.
+    # Chunks come out without a language; callers tag the whole document at once.
+    timings = timings or StageTimings()
+    for page in iter_pages(file_path, timings):
+        with timings.stage("chunk"):
+            chunks = chunker.split_documents([page])
+        for chunk in chunks:
+            chunk.metadata["source_file"] = file_path
+        yield from chunks
+
+
+def iter_pdf_chunk_vectors(file_path, chunker, timings=None):
+    # Like iter_pdf_chunks, but yields (page_chunks, vectors) per page, with the
+    # chunk vectors pooled from the sentence vectors the chunker already computed.
+    timings = timings or StageTimings()
+    for page in iter_pages(file_path, timings):
+        with timings.stage("chunk"):
+            chunks, vectors = chunker.split_documents_with_vectors([page])
         for chunk in chunks:
-            text = chunk.page_content.strip()
-            if len(text) > 20:
-                try:
-                    chunk.metadata["language"] = detect(text)
-                except LangDetectException:
-                    chunk.metadata["language"] = "unknown"
-            else:
-                chunk.metadata["language"] = "unknown"
             chunk.metadata["source_file"] = file_path
+        if chunks:
+            yield chunks, vectors
+
+
+def iter_embedded_batches(file_path, chunker, batch_size=EMBED_BATCH_SIZE, timings=None):
+    # Yields (chunks, embeddings) batches as soon as enough chunks are available,
+    # so embedding overlaps with parsing instead of waiting for the whole file.
+    from mcq_generation.semantic_cluster import embed_manual
+
+    timings = timings or StageTimings()
+    batch = []
+    for chunk in iter_pdf_chunks(file_path, chunker, timings):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            with timings.stage("embed"):
+                embeddings = embed_manual([c.page_content for c in batch])
+            yield batch, embeddings
+            batch = []
+    if batch:
+        with timings.stage("embed"):
+            embeddings = embed_manual([c.page_content for c in batch])
+        yield batch, embeddings
+
+
+def _split_pdf(file_path, chunker, timings=None):
+    timings = timings or StageTimings()
+    chunks = list(iter_pdf_chunks(file_path, chunker, timings))
+    _tag_languages(chunks, timings)
+    return chunks
+
+
+def split_pdfs_parallel(file_paths, chunker, max_workers=INGEST_WORKERS):
+    # Returns [(file_path, chunks or None, vectors or None)] in input order, the
+    # vectors pooled by the chunker. PDF text extraction and language detection
+    # run in worker processes; chunking stays in this process because it needs
+    # the embedding model. A failing file yields None and does not affect the others.
+    # At most max_workers extractions are in flight, so only that many documents'
+    # page text is held at once, not every file's.
+    context = multiprocessing.get_context("spawn")
+    window = max(1, max_workers)
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        queued = iter(file_paths)
+        page_futures = deque()
+
+        def refill():
+            while len(page_futures) < window:
+                file_path = next(queued, None)
+                if file_path is None:
+                    return
+                page_futures.append((file_path, pool.submit(extract_pages, file_path)))
+
+        def collect(file_path, chunks, vectors, language_future):
+            if chunks is None:
+                results.append((file_path, None, None))
+                return
+            try:
+                for chunk, language in zip(chunks, language_future.result()):
+                    chunk.metadata["language"] = language
+                    chunk.metadata["source_file"] = file_path
+                results.append((file_path, chunks, vectors))
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+                results.append((file_path, None, None))
 
-        all_chunks.extend(chunks)
+        refill()
+        pending = deque()
+        while page_futures:
+            file_path, future = page_futures.popleft()
+            try:
+                pages = [Document(page_content=text, metadata=metadata) for text, metadata in future.result()]
+                # The next extraction starts while this file is being chunked.
+                refill()
+                chunks, vectors = chunker.split_documents_with_vectors(pages)
+                del pages
+                language_future = pool.submit(
+                    detect_languages, [c.page_content for c in chunks], [c.metadata.get("page") for c in chunks]
+                )
+                pending.append((file_path, chunks, vectors, language_future))
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+                refill()
+                pending.append((file_path, None, None, None))
+            # Language detection for earlier files finishes while later ones are chunked.
+            while len(pending) > window:
+                collect(*pending.popleft())
+
+        while pending:
+            collect(*pending.popleft())
+    return results
+
+
+def load_and_split_pdfs(file_paths, chunk_size=1000, chunk_overlap=200, workers=INGEST_WORKERS):
+    all_chunks= []
+
+    chunker = _make_chunker()
+
+    if workers > 1 and len(file_paths) > 1:
+        for _, chunks, _ in split_pdfs_parallel(file_paths, chunker, max_workers=workers):
+            all_chunks.extend(chunks or [])
+        return all_chunks
+
+    for file_path in file_paths:
+     try:
+        all_chunks.extend(_split_pdf(file_path, chunker))
 
      except Exception as e:
         print(f"Error loading {file_path}: {e}")
         continue
 
     return all_chunks
+
+
+def cache_params():
+    return {
+        "version": CHUNK_CACHE_VERSION,
+        "model": MODEL_NAME,
+        "chunker": "semantic",
+        "breakpoint_threshold_type": BREAKPOINT_THRESHOLD_TYPE,
+        "breakpoint_threshold_amount": BREAKPOINT_THRESHOLD_AMOUNT,
+        "embedding": CHUNK_VECTORS,
+        "embedding_prefix": PASSAGE_PREFIX if CHUNK_VECTORS == "cls" else "",
+        "embedding_backend": EMBED_BACKEND if CHUNK_VECTORS == "cls" else "sentence-transformers",
+        "language": "langdetect-seeded-page",
+    }
+
+
+def load_and_embed_pdfs(file_paths, cache=None, timings=None, workers=INGEST_WORKERS):
+    # Like load_and_split_pdfs, but also returns the chunk embedding matrix (row i
+    # belongs to chunk i) and serves both from the content-addressed chunk cache.
+    # With CHUNK_VECTORS="pooled" the matrix comes out of the chunker, so each
+    # document goes through the model once; "cls" re-embeds the chunks as before.
+    from mcq_generation.semantic_cluster import embed_manual
+
+    cache = cache or get_chunk_cache()
+    timings = timings or StageTimings()
+    chunker = None
+    per_file = {}
+    keys = {}
+    file_hashes = {}
+
+    for file_path in file_paths:
+        try:
+            # Uploaded blobs carry their hash in the name; no need to read them again.
+            file_hash = blob_sha256(file_path) or file_sha256(file_path)
+        except OSError as e:
+            print(f"Error loading {file_path}: {e}")
+            continue
+        key = cache.make_key(file_hash, cache_params())
+        file_hashes[file_path] = file_hash
+        cached = cache.get(key)
+        if cached is not None:
+            chunks, embeddings = cached
+            for chunk in chunks:
+                chunk.metadata["source_file"] = file_path
+                chunk.metadata["file_sha256"] = file_hash
+            print(f" Chunk cache hit for {file_path}")
+            per_file[file_path] = (chunks, embeddings)
+        else:
+            keys[file_path] = key
+
+    misses = list(keys)
+    if workers > 1 and len(misses) > 1:
+        chunker = _make_chunker()
+        with timings.stage("parallel_split"):
+            split = split_pdfs_parallel(misses, chunker, max_workers=workers)
+        for file_path, chunks, vectors in split:
+            if chunks is None:
+                continue
+            if CHUNK_VECTORS == "pooled" and vectors is not None:
+                embeddings = vectors
+            else:
+                with timings.stage("embed"):
+                    embeddings = embed_manual([c.page_content for c in chunks])
+            cache.put(keys[file_path], chunks, embeddings)
+            per_file[file_path] = (chunks, embeddings)
+    else:
+        for file_path in misses:
+            try:
+                chunker = chunker or _make_chunker()
+                chunks = []
+                batches = []
+                if CHUNK_VECTORS == "pooled":
+                    pages = iter_pdf_chunk_vectors(file_path, chunker, timings=timings)
+                else:
+                    pages = iter_embedded_batches(file_path, chunker, timings=timings)
+                for batch, batch_embeddings in pages:
+                    chunks.extend(batch)
+                    batches.append(batch_embeddings)
+                embeddings = np.concatenate(batches, axis=0) if batches else embed_manual([])
+                _tag_languages(chunks, timings)
+                cache.put(keys[file_path], chunks, embeddings)
+                per_file[file_path] = (chunks, embeddings)
+
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+                continue
+
+    timings.report("Ingest timings")
+    all_chunks = []
+    all_embeddings = []
+    for file_path in file_paths:
+        if file_path in per_file:
+            chunks, embeddings = per_file[file_path]
+            for chunk in chunks:
+                chunk.metadata["file_sha256"] = file_hashes[file_path]
+            all_chunks.extend(chunks)
+            all_embeddings.append(np.asarray(embeddings))
+
+    if not all_embeddings:
+        return all_chunks, np.zeros((0, 0), dtype=np.float32)
+    return all_chunks, np.concatenate(all_embeddings, axis=0)
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from mcq_generation.config import CLUSTER_STORE_DIR
+
+# Remembers, per material, which MCQ was generated from which cluster context so a
+# regeneration only pays for clusters whose selected chunks actually changed.
+_lock = threading.Lock()
+
+
+def context_fingerprint(context: str) -> str:
+    normalized = " ".join(context.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _store_path(material_id, root):
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(material_id))
+    return os.path.join(root, f"{safe_id}.json")
+
+
+def load_cluster_mcqs(material_id, root=CLUSTER_STORE_DIR):
+    try:
+        with open(_store_path(material_id, root), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cluster_mcqs(material_id, mcqs_by_fingerprint, root=CLUSTER_STORE_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = _store_path(material_id, root)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with _lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(mcqs_by_fingerprint, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def plan_regeneration(material_id, contexts, force=False, root=CLUSTER_STORE_DIR):
+    # Returns (fingerprints, reused, pending): reused maps cluster index -> stored
+    # MCQ, pending lists the indices that still need an LLM call.
+    fingerprints = [context_fingerprint(context) for context in contexts]
+    stored = {} if force else load_cluster_mcqs(material_id, root)
+    reused = {i: stored[fp] for i, fp in enumerate(fingerprints) if fp in stored}
+    pending = [i for i in range(len(contexts)) if i not in reused]
+    return fingerprints, reused, pending
@@ -1,16 +1,61 @@
-from transformers import AutoTokenizer, AutoModel
-from keybert import KeyBERT
+import os
 
 MODEL_NAME = "intfloat/multilingual-e5-large"
 
-from langchain_huggingface import HuggingFaceEmbeddings
-embedding_model = HuggingFaceEmbeddings(
-    model_name=MODEL_NAME,
-    encode_kwargs={"normalize_embeddings": True}
-)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# "torch" (default), "int8" (dynamic quantisation) or "onnx" (ONNX Runtime, CPU)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", ".onnx_cache")
+# Chunk vectors for clustering and indexing: "pooled" reuses the sentence vectors
+# SemanticChunker computes for breakpoints; "cls" re-embeds every chunk with
+# embedding_engine (CLS pooling, EMBED_BACKEND).
+CHUNK_VECTORS = os.getenv("CHUNK_VECTORS", "pooled")
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModel.from_pretrained(MODEL_NAME)
-model.eval()
+# Worker processes for multi-file PDF extraction and language detection (1 = serial).
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
 
-kw_model = KeyBERT(model=model)
+CHUNK_CACHE_DIR = os.getenv("CHUNK_CACHE_DIR", ".chunk_cache")
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", ".vector_store")
+CLUSTER_STORE_DIR = os.getenv("CLUSTER_STORE_DIR", ".cluster_store")
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache/responses.sqlite")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+# Cosine similarity at which a candidate context counts as a near-duplicate of
+# another context, and at which it counts as already covered by an existing MCQ
+# stem. e5 similarities sit high (unrelated passages are often above 0.7).
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.95"))
+DEDUP_STEM_THRESHOLD = float(os.getenv("DEDUP_STEM_THRESHOLD", "0.9"))
+
+# Materials whose topic candidate n-gram vectors stay cached in memory.
+TOPIC_CACHE_MATERIALS = int(os.getenv("TOPIC_CACHE_MATERIALS", "32"))
+
+# "two_pass" (self-refine, then distractors) or "json" (one JSON-mode call).
+MCQ_GENERATION_MODE = os.getenv("MCQ_GENERATION_MODE", "two_pass")
+# Repair calls allowed when a json-mode answer fails validation.
+MCQ_JSON_REPAIR_ATTEMPTS = int(os.getenv("MCQ_JSON_REPAIR_ATTEMPTS", "1"))
+
+# RAG retrieval: BM25 over the chunk texts fused with dense scores (retrieval.py).
+# The LLM query rewrite is off unless RAG_QUERY_REWRITE=1.
+RAG_QUERY_REWRITE = os.getenv("RAG_QUERY_REWRITE", "0") == "1"
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+# Entries in each of the rewrite, query-vector and result LRU caches.
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+
+
+# The models themselves live in model_registry and are loaded on first use;
+# these names are kept so older imports from config keep working.
+def __getattr__(name):
+    from mcq_generation import model_registry
+
+    loaders = {
+        "embedding_model": model_registry.get_embeddings,
+        "tokenizer": model_registry.get_tokenizer,
+        "model": model_registry.get_model,
+        "kw_model": model_registry.get_kw_model,
+    }
+    if name in loaders:
+        return loaders[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
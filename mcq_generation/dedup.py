@@ -0,0 +1,120 @@
+import numpy as np
+
+from mcq_generation.config import DEDUP_STEM_THRESHOLD, DEDUP_THRESHOLD, MCQ_GENERATION_MODE
+from mcq_generation.metrics import DEDUP_DROPPED
+
+# Drops candidate contexts that would produce near-identical questions before any
+# LLM call: contexts too close to an earlier candidate or to a context already
+# used, and contexts too close to an MCQ stem already generated for the material.
+# Clustered contexts reuse the chunk vectors they were built from (context_vectors);
+# anything else is embedded with the shared e5 model (SharedEmbeddings), the same
+# space as the pooled chunk vectors.
+
+# LLM calls one MCQ costs per generation mode, for the "calls saved" estimate.
+CALLS_PER_MCQ = {"two_pass": 2, "json": 1}
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed(texts):
+    from mcq_generation.model_registry import get_embeddings
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return _unit(get_embeddings().embed_documents(list(texts)))
+
+
+def context_vectors(clusters, embeddings=None):
+    # One vector per cluster_chunks record without re-embedding its merged text:
+    # the mean of the chunk vectors it was merged from, or its centroid when the
+    # chunk vectors are not at hand.
+    if embeddings is None:
+        return _unit([cluster["centroid"] for cluster in clusters])
+    embeddings = _unit(embeddings)
+    return _unit([embeddings[cluster["chunk_indices"]].mean(axis=0) for cluster in clusters])
+
+
+def similarity_matrix(a, b=None):
+    a = _unit(a)
+    b = a if b is None else _unit(b)
+    if a.size == 0 or b.size == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    return a @ b.T
+
+
+def _merge(kept, duplicate):
+    # Appends the paragraphs of `duplicate` that `kept` does not already contain.
+    paragraphs = [p for p in kept.split("\n\n") if p.strip()]
+    seen = {" ".join(p.split()) for p in paragraphs}
+    extra = [p for p in duplicate.split("\n\n") if p.strip() and " ".join(p.split()) not in seen]
+    return "\n\n".join(paragraphs + extra)
+
+
+def dedup_contexts(contexts, embeddings=None, threshold=DEDUP_THRESHOLD, existing_contexts=None,
+                   existing_stems=None, stem_threshold=DEDUP_STEM_THRESHOLD, merge=False, mode=None):
+    # Returns (kept_indices, merged_texts, stats). kept_indices point into
+    # `contexts` in their original order; merged_texts[j] is the text to use for
+    # kept_indices[j] (different from the input only when merge=True folded a
+    # near-duplicate into it). stats["dropped"] lists [index, reason] for the rest.
+    # Candidates are visited in order, so the first of a group of near-duplicates wins.
+    existing_contexts = list(existing_contexts or [])
+    existing_stems = list(existing_stems or [])
+    stats = {
+        "candidates": len(contexts),
+        "kept": 0,
+        "duplicates": 0,
+        "already_used": 0,
+        "already_asked": 0,
+        "merged": 0,
+        "dropped": [],
+        "threshold": threshold,
+        "stem_threshold": stem_threshold,
+    }
+    if not contexts:
+        stats["llm_calls_saved"] = 0
+        return [], [], stats
+
+    vectors = _unit(embeddings) if embeddings is not None else embed(contexts)
+    # One matrix product per comparison set; the greedy pass below only indexes it.
+    pairwise = similarity_matrix(vectors)
+    against_used = similarity_matrix(vectors, embed(existing_contexts)).max(axis=1, initial=-1.0)
+    against_stems = similarity_matrix(vectors, embed(existing_stems)).max(axis=1, initial=-1.0)
+
+    kept = []
+    texts = {}
+    for i, context in enumerate(contexts):
+        if against_used[i] >= threshold:
+            stats["already_used"] += 1
+            stats["dropped"].append([i, "already_used"])
+            continue
+        if against_stems[i] >= stem_threshold:
+            stats["already_asked"] += 1
+            stats["dropped"].append([i, "already_asked"])
+            continue
+        if kept:
+            similarities = pairwise[i, kept]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                stats["duplicates"] += 1
+                stats["dropped"].append([i, "duplicate"])
+                if merge:
+                    texts[kept[best]] = _merge(texts[kept[best]], context)
+                    stats["merged"] += 1
+                continue
+        kept.append(i)
+        texts[i] = context
+
+    dropped = len(contexts) - len(kept)
+    stats["kept"] = len(kept)
+    stats["llm_calls_saved"] = dropped * CALLS_PER_MCQ.get(mode or MCQ_GENERATION_MODE, 2)
+    for reason in ("duplicates", "already_used", "already_asked"):
+        if stats[reason]:
+            DEDUP_DROPPED.inc(stats[reason], reason=reason)
+    print(f" Dedup kept {len(kept)}/{len(contexts)} contexts "
+          f"({stats['duplicates']} duplicate, {stats['already_used']} already used, "
+          f"{stats['already_asked']} already asked)")
+    return kept, [texts[i] for i in kept], stats
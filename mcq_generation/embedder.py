@@ -1,14 +1,142 @@
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-
-def store_embeddings(chunks, collection_name="user_docs"):
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="intfloat/multilingual-e5-large",
-        encode_kwargs = {"normalize_embeddings": True}
-    )
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_function,
-        collection_name=collection_name
-    )
-    return vectorstore
\ No newline at end of file
+import contextvars
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from mcq_generation.config import CHUNK_VECTORS, VECTOR_STORE_DIR
+from mcq_generation.model_registry import get_embeddings
+
+ADD_BATCH_SIZE = 1000
+
+_lock = threading.Lock()
+_clients = {}
+_vectorstores = {}
+_precomputed = contextvars.ContextVar("embedder_precomputed", default=None)
+
+
+class _PrecomputedEmbeddings(Embeddings):
+    # The vector stores embed through this. Inside _use_vectors(vectors) Chroma's
+    # own add_documents gets the chunk vectors we already have instead of
+    # running the model again; queries always go to the model.
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        vectors = _precomputed.get()
+        if vectors is not None and len(vectors) == len(texts):
+            return vectors
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+@contextmanager
+def _use_vectors(vectors):
+    token = _precomputed.set(vectors)
+    try:
+        yield
+    finally:
+        _precomputed.reset(token)
+
+
+def _get_client(persist_directory):
+    import chromadb
+
+    with _lock:
+        if persist_directory not in _clients:
+            os.makedirs(persist_directory, exist_ok=True)
+            _clients[persist_directory] = chromadb.PersistentClient(path=persist_directory)
+        return _clients[persist_directory]
+
+
+def collection_name_for(key):
+    # Chroma collection names are limited to 3-63 [a-zA-Z0-9._-] characters.
+    return "material_" + hashlib.sha256(str(key).encode("utf-8")).hexdigest()[:40]
+
+
+def open_vectorstore(key, persist_directory=VECTOR_STORE_DIR):
+    # One persistent collection per material (materialID or file hash), reopened
+    # from disk on later requests instead of being re-embedded.
+    name = collection_name_for(key)
+    cache_key = (persist_directory, name)
+    with _lock:
+        vectorstore = _vectorstores.get(cache_key)
+    if vectorstore is None:
+        vectorstore = Chroma(
+            collection_name=name,
+            embedding_function=_PrecomputedEmbeddings(get_embeddings()),
+            client=_get_client(persist_directory),
+        )
+        with _lock:
+            vectorstore = _vectorstores.setdefault(cache_key, vectorstore)
+    return vectorstore
+
+
+def _source_of(chunk):
+    return chunk.metadata.get("file_sha256") or chunk.metadata.get("source_file", "unknown")
+
+
+def _chunk_id(source, i):
+    return f"{source}-{i}"
+
+
+def has_source(vectorstore, source, count):
+    # True once all `count` chunks of source are stored. Batches are written in
+    # order, so the last chunk's id only exists after every earlier batch went in;
+    # a crash halfway through leaves it missing and the source is added again.
+    return bool(vectorstore.get(ids=[_chunk_id(source, count - 1)])["ids"])
+
+
+def add_documents(vectorstore, chunks, embeddings=None):
+    # Indexes chunks grouped by source, skipping sources already fully in the
+    # collection. Ids are derived from the source and position, so re-adding a
+    # source that was interrupted overwrites its partial chunks.
+    # Precomputed chunk vectors (row i for chunk i) are stored as-is when they
+    # share the query embedding space, i.e. CHUNK_VECTORS="pooled" and the store
+    # came from open_vectorstore; otherwise Chroma embeds the chunks itself.
+    if CHUNK_VECTORS != "pooled":
+        embeddings = None
+    by_source = {}
+    for i, chunk in enumerate(chunks):
+        by_source.setdefault(_source_of(chunk), []).append(i)
+
+    added = 0
+    for source, indices in by_source.items():
+        if has_source(vectorstore, source, len(indices)):
+            continue
+        ids = [_chunk_id(source, i) for i in range(len(indices))]
+        for start in range(0, len(indices), ADD_BATCH_SIZE):
+            batch = indices[start:start + ADD_BATCH_SIZE]
+            batch_ids = ids[start:start + ADD_BATCH_SIZE]
+            vectors = None if embeddings is None else np.asarray(embeddings)[batch].tolist()
+            with _use_vectors(vectors):
+                vectorstore.add_documents([chunks[i] for i in batch], ids=batch_ids)
+        added += len(indices)
+    return added
+
+
+def delete_source(vectorstore, source):
+    where = {"$or": [{"file_sha256": source}, {"source_file": source}]}
+    ids = vectorstore.get(where=where)["ids"]
+    if ids:
+        vectorstore.delete(ids=ids)
+    return len(ids)
+
+
+def store_embeddings(chunks, collection_name, persist_directory=VECTOR_STORE_DIR, embeddings=None):
+    # collection_name is required: collections persist across runs, so a shared
+    # default would mix chunks from different materials.
+    vectorstore = open_vectorstore(collection_name, persist_directory)
+    add_documents(vectorstore, chunks, embeddings)
+    return vectorstore
+
+
+def material_key(chunks):
+    sources = sorted({_source_of(chunk) for chunk in chunks})
+    return hashlib.sha256("|".join(sources).encode("utf-8")).hexdigest()
@@ -0,0 +1,112 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from mcq_generation.config import EMBED_BATCH_SIZE, EMBED_BACKEND
+from mcq_generation.model_registry import (
+    get_model,
+    get_onnx_session,
+    get_quantized_model,
+    get_tokenizer,
+)
+
+PASSAGE_PREFIX = "passage: "
+QUERY_PREFIX = "query: "
+MAX_LENGTH = 512
+
+last_run_stats: Dict = {}
+
+
+def _forward_torch(model, batch):
+    # SentenceTransformer puts the model on CUDA when there is one; the padded
+    # batch comes out of the tokenizer on the CPU.
+    device = getattr(model, "device", None)
+    if device is not None and device.type != "cpu":
+        batch = {name: tensor.to(device) for name, tensor in batch.items()}
+    with torch.inference_mode():
+        outputs = model(**batch)
+    return outputs.last_hidden_state[:, 0, :]
+
+
+def _forward_onnx(session, batch):
+    outputs = session.run(
+        ["last_hidden_state"],
+        {
+            "input_ids": batch["input_ids"].numpy().astype(np.int64),
+            "attention_mask": batch["attention_mask"].numpy().astype(np.int64),
+        },
+    )
+    return torch.from_numpy(outputs[0][:, 0, :])
+
+
+def embed_texts(
+    texts: List[str],
+    batch_size: Optional[int] = None,
+    prefix: str = PASSAGE_PREFIX,
+    backend: Optional[str] = None,
+    max_length: int = MAX_LENGTH,
+) -> np.ndarray:
+    # Normalised CLS embeddings. Texts are tokenised once, sorted by length and fed
+    # in fixed-size batches so each batch is only padded to its own longest text.
+    global last_run_stats
+
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    backend = backend or EMBED_BACKEND
+    tokenizer = get_tokenizer()
+    hidden_size = get_model().config.hidden_size
+    if not texts:
+        return np.zeros((0, hidden_size), dtype=np.float32)
+
+    start = time.perf_counter()
+    encoded = tokenizer(
+        [prefix + text for text in texts],
+        truncation=True,
+        max_length=max_length,
+        padding=False,
+    )
+    input_ids = encoded["input_ids"]
+    order = np.argsort([len(ids) for ids in input_ids], kind="stable")
+
+    if backend == "onnx":
+        session = get_onnx_session()
+        forward = lambda batch: _forward_onnx(session, batch)
+    elif backend == "int8":
+        quantized = get_quantized_model()
+        forward = lambda batch: _forward_torch(quantized, batch)
+    elif backend == "torch":
+        model = get_model()
+        forward = lambda batch: _forward_torch(model, batch)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    result = np.zeros((len(texts), hidden_size), dtype=np.float32)
+    real_tokens = 0
+    padded_tokens = 0
+    for offset in range(0, len(order), batch_size):
+        indices = order[offset:offset + batch_size]
+        batch = tokenizer.pad(
+            {
+                "input_ids": [input_ids[i] for i in indices],
+                "attention_mask": [encoded["attention_mask"][i] for i in indices],
+            },
+            return_tensors="pt",
+        )
+        cls = forward(batch)
+        result[indices] = torch.nn.functional.normalize(cls, p=2, dim=1).cpu().numpy()
+        real_tokens += int(batch["attention_mask"].sum())
+        padded_tokens += batch["input_ids"].numel()
+
+    elapsed = time.perf_counter() - start
+    last_run_stats = {
+        "backend": backend,
+        "chunks": len(texts),
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(len(texts) / elapsed, 2) if elapsed > 0 else None,
+        "padding_ratio": round(1 - real_tokens / padded_tokens, 4) if padded_tokens else 0.0,
+    }
+    print(f" Embedded {len(texts)} chunks in {elapsed:.2f}s "
+          f"({last_run_stats['chunks_per_second']} chunks/s, backend={backend})")
+    return result
@@ -0,0 +1,61 @@
+import hashlib
+import itertools
+import json
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from pydantic import PrivateAttr
+
+
+class FakeMCQLLM(LLM):
+    """Deterministic offline stand-in for Gemini/Ollama in tests and benchmarks.
+
+    Answers the self-refine and distractor prompts in the formats mcq_gen expects,
+    sleeping `latency` seconds per call. With rate_limit_every=n every n-th call
+    raises a 429-style error so retry paths can be exercised, and with
+    malformed_every=n every n-th JSON answer is broken so repair paths can be.
+    """
+
+    latency: float = 0.0
+    rate_limit_every: int = 0
+    malformed_every: int = 0
+    model: str = "fake-mcq"
+    temperature: float = 0.0
+
+    _calls: Any = PrivateAttr(default_factory=itertools.count)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-mcq"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        call_number = next(self._calls) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit_every and call_number % self.rate_limit_every == 0:
+            raise RuntimeError("429 Resource has been exhausted (fake rate limit)")
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        if "Revised MCQ:" in prompt or '"distractors"' in prompt:
+            if self.malformed_every and call_number % self.malformed_every == 0:
+                # Fenced, trailing comma, and the key repeated as a distractor.
+                return (
+                    "```json\n"
+                    f'{{"stem": "Which statement about concept {digest} is correct?", '
+                    f'"key": "Correct statement {digest}", '
+                    f'"distractors": ["Correct statement {digest}", "Wrong statement {digest}-1", '
+                    f'"Wrong statement {digest}-2",],}}\n```'
+                )
+            return json.dumps({
+                "stem": f"Which statement about concept {digest} is correct?",
+                "key": f"Correct statement {digest}",
+                "distractors": [f"Wrong statement {digest}-{i}" for i in range(1, 4)],
+            })
+        return (
+            f"STEM: What is concept {digest}?\n"
+            f"ANSWER: Correct statement {digest}\n"
+            "CRITIQUE: Too direct.\n"
+            f"IMPROVED: Which statement about concept {digest} is correct?\n"
+            f"ANSWER: Correct statement {digest}"
+        )
@@ -0,0 +1,17 @@
+from langchain_community.document_loaders import PyPDFLoader
+
+from mcq_generation.language import detect_chunk_languages
+
+# The tasks chunk_files.split_pdfs_parallel sends to its spawned worker processes.
+# A spawned worker imports the module of the function it runs, so they live here
+# rather than in chunk_files: this module only needs the PDF loader and
+# langdetect, not torch or the embedding model.
+
+
+def extract_pages(file_path):
+    # Plain text extraction, no model needed.
+    return [(page.page_content, page.metadata) for page in PyPDFLoader(file_path).lazy_load()]
+
+
+def detect_languages(texts, pages):
+    return detect_chunk_languages(texts, pages)[0]
@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from langdetect import DetectorFactory, LangDetectException, detect_langs
+
+# Deterministic, hierarchical language tagging for chunks. langdetect samples
+# n-grams at random; a fixed seed makes the same text always get the same
+# answer. Most PDFs are in one language, so the document and each page are
+# detected once and every chunk on a page that agrees with its document takes
+# that answer. Only pages that disagree with the document, or that the
+# detector is unsure about, are classified chunk by chunk.
+
+DetectorFactory.seed = 0
+
+UNKNOWN = "unknown"
+MIN_TEXT_CHARS = 20
+# Minimum probability for a page-level answer to be applied to all its chunks.
+PAGE_CONFIDENCE = 0.9
+# Characters of the document sampled for document-level detection (langdetect
+# itself reads at most 10000).
+DOCUMENT_SAMPLE_CHARS = 10000
+
+
+def detect_with_confidence(text):
+    # Returns (language, probability); short or undetectable text is "unknown".
+    text = text.strip()
+    if len(text) <= MIN_TEXT_CHARS:
+        return UNKNOWN, 0.0
+    try:
+        best = detect_langs(text)[0]
+    except (LangDetectException, IndexError):
+        return UNKNOWN, 0.0
+    return best.lang, best.prob
+
+
+def detect_language(text):
+    return detect_with_confidence(text)[0]
+
+
+def _sample(texts, limit):
+    joined = "\n".join(texts)
+    if len(joined) <= limit:
+        return joined
+    # Every n-th page, so the sample covers the whole document, not its opening pages.
+    step = -(-len(joined) // limit)
+    return "\n".join(texts[::step])[:limit]
+
+
+def detect_chunk_languages(texts, pages):
+    # texts[i] is chunk i and pages[i] its page key (any hashable). Returns
+    # (languages, stats) with one language per chunk.
+    languages = [UNKNOWN] * len(texts)
+    stats = {"chunks": len(texts), "pages": 0, "fallback_pages": 0, "detector_calls": 0, "document_language": UNKNOWN}
+    if not texts:
+        return languages, stats
+
+    by_page = defaultdict(list)
+    for i, page in enumerate(pages):
+        by_page[page].append(i)
+    page_texts = {page: " ".join(texts[i] for i in indices) for page, indices in by_page.items()}
+    stats["pages"] = len(by_page)
+
+    document_language, _ = detect_with_confidence(_sample(list(page_texts.values()), DOCUMENT_SAMPLE_CHARS))
+    stats["document_language"] = document_language
+    stats["detector_calls"] += 1
+
+    for page, indices in by_page.items():
+        page_language, confidence = detect_with_confidence(page_texts[page])
+        stats["detector_calls"] += 1
+        if len(indices) == 1:
+            # The page text is the chunk text: its answer is already the chunk's.
+            languages[indices[0]] = page_language
+            continue
+        if page_language == document_language != UNKNOWN and confidence >= PAGE_CONFIDENCE:
+            for i in indices:
+                # Chunks too short to classify stay "unknown", as with per-chunk detection.
+                languages[i] = page_language if len(texts[i].strip()) > MIN_TEXT_CHARS else UNKNOWN
+            continue
+        stats["fallback_pages"] += 1
+        for i in indices:
+            languages[i] = detect_language(texts[i])
+            stats["detector_calls"] += 1
+    return languages, stats
+
+
+def tag_languages(chunks):
+    # Sets metadata["language"] on every chunk of one document in a single batch.
+    languages, stats = detect_chunk_languages(
+        [chunk.page_content for chunk in chunks], [chunk.metadata.get("page") for chunk in chunks]
+    )
+    for chunk, language in zip(chunks, languages):
+        chunk.metadata["language"] = language
+    return stats
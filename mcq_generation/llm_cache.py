@@ -0,0 +1,190 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from mcq_generation.config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS
+
+# LangChain looks the cache up right before calling the provider, so a lookup
+# hook learns whether the call will reach the provider at all. llm_executor uses
+# it to take a rate-limit token only on a miss.
+_lookup_hook = contextvars.ContextVar("response_cache_lookup_hook", default=None)
+
+
+@contextmanager
+def on_lookup(hook: Callable[[bool], None]):
+    # hook(hit) is called for every ResponseCache lookup made in this context.
+    token = _lookup_hook.set(hook)
+    try:
+        yield
+    finally:
+        _lookup_hook.reset(token)
+
+
+def _notify(hit: bool) -> None:
+    hook = _lookup_hook.get()
+    if hook is not None:
+        hook(hit)
+
+
+class ResponseCache(BaseCache):
+    """SQLite-backed LangChain cache with TTL, size-bounded eviction and stats.
+
+    LangChain passes the fully rendered prompt and an llm_string describing the
+    model (name, temperature and other call parameters), so the key covers the
+    backend, the prompt template and its input. Attach it through the `cache`
+    field that ChatGoogleGenerativeAI and OllamaLLM both inherit.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                 max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                hit = False
+            else:
+                self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                hit = True
+        _notify(hit)
+        return [loads(generation) for generation in json.loads(row[0])] if hit else None
+
+    def update(self, prompt: str, llm_string: str, return_val: Any) -> None:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        response = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, llm_string, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, response, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.evictions += cursor.rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self.evictions += cursor.rowcount
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+
+    def write_only(self) -> "WriteThroughCache":
+        return WriteThroughCache(self)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class WriteThroughCache(BaseCache):
+    # Used for "fresh questions" requests: always misses, but stores the new
+    # answer so later cached runs see the latest version.
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        _notify(False)
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Any) -> None:
+        self.cache.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear(**kwargs)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
+
+
+def uses_response_cache(model) -> bool:
+    return isinstance(getattr(model, "cache", None), (ResponseCache, WriteThroughCache))
+
+
+def with_response_cache(model):
+    # Every LLM built for generation goes through the shared response cache; a
+    # model with its own cache (or cache=False) is left alone.
+    if getattr(model, "cache", False) is None:
+        return model.model_copy(update={"cache": get_response_cache()})
+    return model
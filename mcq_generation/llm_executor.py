@@ -0,0 +1,151 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from mcq_generation.metrics import submit_in_context
+
+load_dotenv()
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+# Rough completion size used when reserving token budget before a call.
+COMPLETION_TOKEN_ESTIMATE = 400
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        # Takes `amount` from the bucket (allowing it to go negative) and returns how
+        # long the caller has to wait before that amount is actually available.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens=0):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            self.waited_seconds += wait
+            time.sleep(wait)
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_default_limiter():
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
+
+
+def is_rate_limit_error(error):
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "resourceexhausted" in text or "resource exhausted" in text or "rate limit" in text
+
+
+def _cached_model(chain):
+    # The model step of a prompt | model | parser chain, if it uses the response cache.
+    from mcq_generation.llm_cache import uses_response_cache
+
+    for step in getattr(chain, "steps", [chain]):
+        if uses_response_cache(step):
+            return step
+    return None
+
+
+def invoke_with_retry(chain, inputs, prompt_tokens=0, limiter=None, max_retries=LLM_MAX_RETRIES,
+                      base_delay=1.0, max_delay=30.0, call_info=None):
+    # With a response-cached model the rate-limit token is taken only when the
+    # cache misses, i.e. right before the provider call; a cache hit neither
+    # waits nor spends budget. call_info, if given, gets "cached": True when the
+    # answer came from the cache without any provider call.
+    from mcq_generation.llm_cache import on_lookup
+
+    limiter = limiter or get_default_limiter()
+    cached_model = _cached_model(chain) is not None
+    lookups = []
+
+    def acquire_on_miss(hit):
+        lookups.append(hit)
+        if not hit:
+            limiter.acquire(prompt_tokens + COMPLETION_TOKEN_ESTIMATE)
+
+    for attempt in range(max_retries + 1):
+        if not cached_model:
+            limiter.acquire(prompt_tokens + COMPLETION_TOKEN_ESTIMATE)
+        try:
+            with on_lookup(acquire_on_miss):
+                output = chain.invoke(inputs)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f" Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            continue
+        if call_info is not None:
+            call_info["cached"] = cached_model and bool(lookups) and all(lookups)
+        return output
+
+
+def run_clusters(contexts, generate_fn=None, max_concurrency=LLM_MAX_CONCURRENCY, executor=None,
+                 on_result=None, on_error=None, **generate_kwargs):
+    # Runs generate_fn over every context concurrently and returns the results in
+    # the same order as `contexts`. A cluster that raises yields None.
+    # on_result(index, result) is called as soon as each cluster finishes, preceded
+    # by on_error(index, exception) when it raised.
+    if generate_fn is None:
+        from mcq_generation.mcq_gen import generate_mcq
+        generate_fn = generate_mcq
+
+    def run_one(index, context):
+        try:
+            result = generate_fn(context, **generate_kwargs)
+        except Exception as e:
+            print(f" Cluster {index} failed: {e}")
+            result = None
+            if on_error is not None:
+                on_error(index, e)
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="mcq-llm")
+    try:
+        futures = [submit_in_context(executor, run_one, i, context) for i, context in enumerate(contexts)]
+        return [future.result() for future in futures]
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
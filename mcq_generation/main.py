@@ -1,29 +1,34 @@
-from chunk_files import load_and_split_pdfs
-from mcq_generation.embedder import store_embeddings
+from mcq_generation.chunk_files import load_and_embed_pdfs
+from mcq_generation.embedder import store_embeddings, material_key
 import sys
 
 def run_pipeline(pdf_paths, user_query):
     
-    chunks = load_and_split_pdfs(pdf_paths)
+    chunks, embeddings = load_and_embed_pdfs(pdf_paths)
 
     if not chunks:
         print(" No chunks found in the document.")
         return
         
-    vectorstore = store_embeddings(chunks)
+    vectorstore = store_embeddings(chunks, collection_name=material_key(chunks), embeddings=embeddings)
 
-    from rag import prompt_rewrite, react_prompt, StrOutputParser, OllamaLLM
+    from langchain_ollama import OllamaLLM
+    from rag import prompt_rewrite, react_prompt, StrOutputParser
+    from mcq_generation.config import RAG_QUERY_REWRITE
+    from mcq_generation.llm_cache import with_response_cache
+    from mcq_generation.retrieval import get_hybrid_retriever
     #llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.2)
-    llm = OllamaLLM(model = "llama3", temperature=0.2)
-    rewrite_chain = prompt_rewrite | llm | StrOutputParser()
+    llm = with_response_cache(OllamaLLM(model = "llama3", temperature=0.2))
     answer_chain = react_prompt | llm | StrOutputParser()
-    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 10, "fetch_k": 20})
+    retriever = get_hybrid_retriever(vectorstore, k=10)
+    rewriter = prompt_rewrite | llm | StrOutputParser() if RAG_QUERY_REWRITE else None
 
     print("\n Original Query:", user_query)
 
 
-    rewritten_query = rewrite_chain.invoke(user_query)
-    print(" Rewritten Query:\n", rewritten_query)
+    rewritten_query = retriever.rewrite(user_query, rewriter)
+    if rewritten_query != user_query:
+        print(" Rewritten Query:\n", rewritten_query)
 
 
     retrieved_docs = retriever.invoke(rewritten_query)
@@ -1,34 +1,88 @@
 import re
 import os
 import json
-from mcq_generation.semantic_cluster import retrieve_diverse_chunks
-from mcq_generation.chunk_files import load_and_split_pdfs
-from mcq_generation.embedder import store_embeddings
+import threading
 from langchain_core.prompts import PromptTemplate
-from langchain.schema import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import OllamaLLM
-from mcq_generation.config import kw_model
-import time
-import tiktoken
-from mcq_generation.rag import retrieve_relevant_chunks
+from langchain_core.output_parsers import StrOutputParser
+from mcq_generation.llm_executor import invoke_with_retry, run_clusters
+from mcq_generation.llm_cache import ResponseCache, with_response_cache
+from mcq_generation.metrics import LLM_CALLS, LLM_TOKENS, MCQ_PARSE_OUTCOMES, span
+from mcq_generation.mcq_schema import MCQ_JSON_SCHEMA, parse_mcq_json, validate_mcq
+from mcq_generation.config import MCQ_GENERATION_MODE, MCQ_JSON_REPAIR_ATTEMPTS
 import random
 from dotenv import load_dotenv
 
-ENCODING = tiktoken.encoding_for_model("gpt-3.5-turbo")
+# The Gemini client, the tiktoken encoding and the default chains are built on
+# first use (or by warm_up), and the ingest/clustering modules (torch, Chroma,
+# the PDF loaders) are imported only where they are used, so importing this
+# module stays cheap.
+_lazy_lock = threading.Lock()
+_encoding = None
+_llm = None
+_default_chains = {}
+
+# "two_pass": self-refine call, then a distractor call (the original flow).
+# "json": one JSON-mode call returning stem, key and distractors, validated
+# strictly and sent back to the model for a targeted repair when malformed.
+TWO_PASS = "two_pass"
+JSON_MODE = "json"
+GENERATION_MODES = (TWO_PASS, JSON_MODE)
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _lazy_lock:
+            if _encoding is None:
+                import tiktoken
+
+                _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    return _encoding
+
 
 def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
+    return len(get_encoding().encode(text))
+
 
 total_tokens_used = 0
+_tokens_lock = threading.Lock()
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.2)
-# llm = OllamaLLM(model="llama3", temperature=0.2)
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _lazy_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+
+                _llm = with_response_cache(ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.2))
+                # from langchain_ollama import OllamaLLM
+                # _llm = with_response_cache(OllamaLLM(model="llama3", temperature=0.2))
+    return _llm
+
+
+def warm_up():
+    # Builds everything generate_mcq needs up front; mcq_api calls this at startup.
+    get_encoding()
+    for mode in GENERATION_MODES:
+        _chains_for(mode=mode)
+
+
+def __getattr__(name):
+    # Older code imported llm / self_refine_chain / cot_chain from here.
+    if name == "llm":
+        return get_llm()
+    if name == "self_refine_chain":
+        return _chains_for()[0]
+    if name == "cot_chain":
+        return _chains_for()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 parser = StrOutputParser()
 
@@ -77,8 +131,42 @@ Revised MCQ:
 """
 )
 
-self_refine_chain = self_refine_prompt | llm | parser
-cot_chain = cot_prompt | llm | parser
+single_pass_prompt = PromptTemplate(
+    input_variables=["context"],
+    template="""
+Given the following university course content, write one high-quality multiple-choice question.
+
+Before answering, silently draft the question, check that it is clear, not too easy and answerable
+from the context alone, and improve it. Focus on unique, non-redundant concepts drawn from the context.
+Try to cover under-assessed or deeper understanding concepts if possible.
+
+Return only a JSON object with exactly these fields:
+{{
+  "stem": "<the final question>",
+  "key": "<the correct answer>",
+  "distractors": ["<plausible wrong answer>", "<plausible wrong answer>", "<plausible wrong answer>"]
+}}
+
+The three distractors must be plausible but incorrect, distinct from each other and from the key.
+
+Context:
+{context}
+"""
+)
+
+repair_prompt = PromptTemplate(
+    input_variables=["output", "problems"],
+    template="""
+The output below was supposed to be a JSON multiple-choice question but has these problems:
+{problems}
+
+Fix only those problems and return the corrected JSON object with the fields "stem", "key" and
+"distractors" (exactly 3 strings). Do not add explanations or additional commentary.
+
+Output:
+{output}
+"""
+)
 
 def extract_last_improved_mcq(raw_output):
     lines = raw_output.splitlines()
@@ -119,7 +207,9 @@ def extract_json_block(text):
     return None
 
 def extract_topic_label(text: str) -> str:
-    keywords = kw_model.extract_keywords(
+    from mcq_generation.model_registry import get_kw_model
+
+    keywords = get_kw_model().extract_keywords(
         text,
         keyphrase_ngram_range=(1, 2),
         stop_words=["english", "romanian"],
@@ -130,21 +220,120 @@ def extract_topic_label(text: str) -> str:
         return str(keywords[0][0])
     return "Unknown"
 
-def generate_mcq(context):
+def _json_mode(model):
+    # Gemini takes a response MIME type (and a schema on newer clients), Ollama
+    # takes format="json". Other models rely on the prompt and strict validation.
+    fields = type(model).model_fields
+    if "response_mime_type" in fields:
+        update = {"response_mime_type": "application/json"}
+        if "response_schema" in fields:
+            update["response_schema"] = MCQ_JSON_SCHEMA
+        return model.model_copy(update=update)
+    if "format" in fields:
+        return model.model_copy(update={"format": "json"})
+    return model
+
+
+def _chains_for(model=None, fresh=False, mode=TWO_PASS):
+    # Returns (self_refine, distractors) chains for two_pass, (single_pass, repair)
+    # for json. The chains for the default model are built once and reused.
+    if model is None and not fresh and mode in _default_chains:
+        return _default_chains[mode]
+    base = model or get_llm()
+    if fresh:
+        # Skip cached answers but still record the new ones.
+        fresh_cache = base.cache.write_only() if isinstance(base.cache, ResponseCache) else False
+        base = base.model_copy(update={"cache": fresh_cache})
+    if mode == JSON_MODE:
+        json_model = _json_mode(base)
+        chains = single_pass_prompt | json_model | parser, repair_prompt | json_model | parser
+    else:
+        chains = self_refine_prompt | base | parser, cot_prompt | base | parser
+    if model is None and not fresh:
+        _default_chains[mode] = chains
+    return chains
+
 
-    raw_output = self_refine_chain.invoke({"context": context})
+def _invoke_llm(step, chain, inputs, prompt_text, limiter=None):
+    global total_tokens_used
+    prompt_tokens = count_tokens(prompt_text)
+    call_info = {}
+    with span(f"llm.{step}", prompt_tokens=prompt_tokens) as attributes:
+        try:
+            output = invoke_with_retry(chain, inputs, prompt_tokens=prompt_tokens, limiter=limiter,
+                                       call_info=call_info)
+        except Exception:
+            LLM_CALLS.inc(step=step, outcome="error")
+            raise
+        attributes["cached"] = call_info.get("cached", False)
+        if attributes["cached"]:
+            # Served by the response cache: no provider call, no tokens spent.
+            return output
+        completion_tokens = count_tokens(output)
+        attributes["completion_tokens"] = completion_tokens
+
+    LLM_CALLS.inc(step=step, outcome="ok")
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind="completion")
+    with _tokens_lock:
+        total_tokens_used += prompt_tokens + completion_tokens
+    return output
+
+
+def generate_mcq(context, llm=None, limiter=None, fresh=False, mode=None):
+    mode = mode or MCQ_GENERATION_MODE
+    if mode == JSON_MODE:
+        return _generate_mcq_json(context, llm, limiter, fresh)
+    if mode != TWO_PASS:
+        raise ValueError(f"Unknown generation mode {mode!r}, expected one of {GENERATION_MODES}")
+
+    refine_chain, distractor_chain = _chains_for(llm, fresh)
+
+    raw_output = _invoke_llm(
+        "self_refine", refine_chain, {"context": context},
+        self_refine_prompt.format(context=context), limiter=limiter,
+    )
     print("\n RAW OUTPUT FROM SELF-REFINE:\n", raw_output)
 
     improved = extract_last_improved_mcq(raw_output)
     if not improved:
         print(" Could not extract improved MCQ.")
+        MCQ_PARSE_OUTCOMES.inc(mode=TWO_PASS, outcome="failed")
         return None
 
-    final_mcq = cot_chain.invoke({"revised": improved})
+    final_mcq = _invoke_llm(
+        "distractors", distractor_chain, {"revised": improved},
+        cot_prompt.format(revised=improved), limiter=limiter,
+    )
 
     parsed = extract_json_block(final_mcq)
+    MCQ_PARSE_OUTCOMES.inc(mode=TWO_PASS, outcome="ok" if parsed else "failed")
     return parsed
 
+
+def _generate_mcq_json(context, llm=None, limiter=None, fresh=False):
+    single_chain, repair_chain = _chains_for(llm, fresh, mode=JSON_MODE)
+
+    output = _invoke_llm(
+        "single_pass", single_chain, {"context": context},
+        single_pass_prompt.format(context=context), limiter=limiter,
+    )
+    for attempt in range(MCQ_JSON_REPAIR_ATTEMPTS + 1):
+        data, error = parse_mcq_json(output)
+        mcq, problems = validate_mcq(data) if error is None else (None, [error])
+        if mcq:
+            MCQ_PARSE_OUTCOMES.inc(mode=JSON_MODE, outcome="repaired" if attempt else "ok")
+            return mcq
+        print(f" Malformed MCQ JSON ({'; '.join(problems)})")
+        if attempt == MCQ_JSON_REPAIR_ATTEMPTS:
+            break
+        inputs = {"output": output, "problems": "\n".join(f"- {p}" for p in problems)}
+        output = _invoke_llm("repair", repair_chain, inputs, repair_prompt.format(**inputs), limiter=limiter)
+
+    MCQ_PARSE_OUTCOMES.inc(mode=JSON_MODE, outcome="failed")
+    return None
+
+
 def retrieve_mcqs_from_seed_queries(retriever, k=5):
     seed_queries = [
         "What are the key components of their functions?",
@@ -171,6 +360,13 @@ According to the following technical content, answer the question below (in Engl
 """
 
 if __name__ == "__main__":
+    from mcq_generation.chunk_files import load_and_embed_pdfs
+    from mcq_generation.dedup import dedup_contexts
+    from mcq_generation.embedder import material_key, store_embeddings
+    from mcq_generation.rag import retrieve_relevant_chunks
+    from mcq_generation.semantic_cluster import cluster_chunks
+    from mcq_generation.topics import label_clusters
+
     pdfs = [
         "example_data/SI_Curs1.pdf",
         #"example_data/SI_Curs2.pdf"
@@ -181,49 +377,59 @@ if __name__ == "__main__":
         #"example_data/PAM.pdf",
     ]
 
-    chunks = load_and_split_pdfs(pdfs)
-    clustered_contexts = retrieve_diverse_chunks(chunks, k=10)
+    chunks, embeddings = load_and_embed_pdfs(pdfs)
+    clusters = cluster_chunks(chunks, k=10, embeddings=embeddings)
 
-    vectorstore = store_embeddings(chunks)
+    material = material_key(chunks)
+    vectorstore = store_embeddings(chunks, collection_name=material, embeddings=embeddings)
     retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 10})
 
     desired_mcq_count = 10
     all_mcqs = []
 
 
-    for i, context in enumerate(clustered_contexts):
-        topic = extract_topic_label(context)
+    raw_contexts = []
+    for i, topic in enumerate(label_clusters(clusters, material=material)):
         print(f" Cluster {i + 1} Topic: {topic}")
 
         relevant_chunks = retrieve_relevant_chunks(topic, vectorstore, top_k=3)
         if not relevant_chunks:
             continue
+        raw_contexts.append("\n".join(relevant_chunks))
 
+    # Topics often retrieve the same chunks; near-identical contexts are merged
+    # before paying for a question on each.
+    _, raw_contexts, dedup_stats = dedup_contexts(raw_contexts, merge=True)
+
+    prompt_contexts = []
+    for context in raw_contexts:
         if random.random() < 0.7:
-            prompt_context = scenario_prompt_template.format(context="\n".join(relevant_chunks))
+            prompt_contexts.append(scenario_prompt_template.format(context=context))
         else:
-            prompt_context = direct_prompt_template.format(context="\n".join(relevant_chunks))
+            prompt_contexts.append(direct_prompt_template.format(context=context))
 
-        mcq = generate_mcq(prompt_context)
-        time.sleep(4 + i * 0.5)
+    for mcq in run_clusters(prompt_contexts[:desired_mcq_count]):
         if mcq:
             mcq["source"] = "cluster"
             all_mcqs.append(mcq)
-        if len(all_mcqs) >= desired_mcq_count:
-            break
 
 
     if len(all_mcqs) < desired_mcq_count:
         needed = desired_mcq_count - len(all_mcqs)
         print(f" Only {len(all_mcqs)} MCQs from clusters — using retriever fallback for {needed} more...")
         fallback_contexts = retrieve_mcqs_from_seed_queries(retriever, k=needed)
-        for ctx in fallback_contexts:
-            mcq = generate_mcq(ctx)
+        _, fallback_contexts, fallback_stats = dedup_contexts(
+            fallback_contexts,
+            existing_contexts=raw_contexts[:desired_mcq_count],
+            existing_stems=[mcq["stem"] for mcq in all_mcqs],
+        )
+        dedup_stats["llm_calls_saved"] += fallback_stats["llm_calls_saved"]
+        for mcq in run_clusters(fallback_contexts):
             if mcq:
                 mcq["source"] = "retriever"
                 all_mcqs.append(mcq)
-            if len(all_mcqs) >= desired_mcq_count:
-                break
+
+    print(f" Deduplication saved about {dedup_stats['llm_calls_saved']} LLM calls")
 
     if all_mcqs:
         with open("generated_mcqs.json", "w", encoding="utf-8") as f:
@@ -0,0 +1,91 @@
+import json
+import re
+
+# Strict parsing and validation for the single-pass JSON generation mode.
+
+DISTRACTOR_COUNT = 3
+
+# Passed to Gemini as response_schema where the client supports it.
+MCQ_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "stem": {"type": "string"},
+        "key": {"type": "string"},
+        "distractors": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": DISTRACTOR_COUNT,
+            "maxItems": DISTRACTOR_COUNT,
+        },
+    },
+    "required": ["stem", "key", "distractors"],
+}
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+
+
+def _outer_object(text):
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else None
+
+
+def parse_mcq_json(text):
+    # Returns (data, error). Tries the text as-is, then the outermost {...} span
+    # with code fences, smart quotes and trailing commas cleaned up.
+    text = _FENCE.sub("", text or "").strip()
+    try:
+        return json.loads(text), None
+    except json.JSONDecodeError as e:
+        error = f"invalid JSON: {e}"
+
+    candidate = _outer_object(text)
+    if candidate is None:
+        return None, "no JSON object in the output"
+    candidate = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+    try:
+        return json.loads(candidate), None
+    except json.JSONDecodeError:
+        return None, error
+
+
+def _clean(value):
+    return " ".join(value.split()) if isinstance(value, str) else ""
+
+
+def validate_mcq(data):
+    # Returns (mcq, problems). Safe fixes are applied locally: whitespace, duplicate
+    # distractors, a distractor equal to the key, more than three distractors.
+    # Anything else is reported back so the caller can ask the model to repair it.
+    if not isinstance(data, dict):
+        return None, ["the output must be a JSON object"]
+
+    problems = []
+    stem = _clean(data.get("stem"))
+    key = _clean(data.get("key"))
+    if not stem:
+        problems.append('"stem" must be a non-empty string')
+    if not key:
+        problems.append('"key" must be a non-empty string')
+
+    raw = data.get("distractors")
+    if not isinstance(raw, list):
+        problems.append(f'"distractors" must be a list of {DISTRACTOR_COUNT} strings')
+        raw = []
+    seen = {key.casefold()}
+    distractors = []
+    for value in raw:
+        value = _clean(value)
+        if value and value.casefold() not in seen:
+            seen.add(value.casefold())
+            distractors.append(value)
+    if isinstance(data.get("distractors"), list) and len(distractors) < DISTRACTOR_COUNT:
+        problems.append(
+            f'"distractors" needs {DISTRACTOR_COUNT} distinct non-empty answers that differ from the key, '
+            f"got {len(distractors)}"
+        )
+
+    if problems:
+        return None, problems
+    return {"stem": stem, "key": key, "distractors": distractors[:DISTRACTOR_COUNT]}, []
@@ -0,0 +1,269 @@
+import contextvars
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Minimal Prometheus-compatible metrics plus optional per-request traces.
+# Everything lives in-process; /metrics in mcq_api renders REGISTRY as text.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        # function() returns a number, or a {label tuple: number} dict for labelled gauges.
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            values = value if isinstance(value, dict) else {(): value}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): v for key, v in values.items()}
+        return super()._samples()
+
+
+class CounterFunction(Gauge):
+    # A counter whose totals are kept elsewhere (e.g. a cache's hit and miss
+    # counts) and read from function() at scrape time.
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {repr(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "mcq_stage_duration_seconds", "Time spent per pipeline stage.", ["stage"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "mcq_llm_tokens_total", "LLM tokens by kind (prompt or completion), counted with tiktoken.", ["kind"]))
+LLM_CALLS = REGISTRY.register(Counter(
+    "mcq_llm_calls_total", "LLM chain invocations by step and outcome.", ["step", "outcome"]))
+MCQ_PARSE_OUTCOMES = REGISTRY.register(Counter(
+    "mcq_parse_outcomes_total", "Generated MCQs by generation mode and parse outcome.", ["mode", "outcome"]))
+DEDUP_DROPPED = REGISTRY.register(Counter(
+    "mcq_dedup_dropped_total", "Candidate contexts dropped before generation, by reason.", ["reason"]))
+DB_ROUND_TRIPS = REGISTRY.register(Counter(
+    "mcq_db_round_trips_total", "Database round trips by operation.", ["operation"]))
+JOBS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mcq_jobs_in_flight", "Generation jobs queued or running."))
+CACHE_LOOKUPS = REGISTRY.register(CounterFunction(
+    "mcq_cache_lookups_total", "Cache lookups by cache and result since process start.", ["cache", "result"]))
+CACHE_HIT_RATE = REGISTRY.register(Gauge(
+    "mcq_cache_hit_ratio", "Cache hit ratio since process start.", ["cache"]))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "mcq_startup_seconds", "Time spent per startup phase (import, preload, models, llm).", ["phase"]))
+
+
+class Trace:
+    def __init__(self, name):
+        self.trace_id = str(uuid.uuid4())
+        self.name = name
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        return {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at, "spans": spans}
+
+
+_current_trace = contextvars.ContextVar("mcq_trace", default=None)
+
+
+@contextmanager
+def use_trace(trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage, **attributes):
+    # Observes the stage latency histogram and, when a trace is active in this
+    # context, records the span with its attributes. The yielded dict can be used
+    # to attach attributes that are only known once the work is done.
+    start_wall = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.observe(duration, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            record = {
+                "name": stage,
+                "start": start_wall,
+                "duration_seconds": round(duration, 6),
+                "thread": threading.current_thread().name,
+                "attributes": attributes,
+            }
+            if error:
+                record["error"] = error
+            trace.add(record)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    # Thread pools do not inherit contextvars; carry the active trace across.
+    # Process pools cannot, so their work shows up only in the caller's span.
+    if isinstance(executor, ProcessPoolExecutor):
+        return executor.submit(fn, *args, **kwargs)
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def register_cache(name, stats_fn):
+    # stats_fn returns a dict with "hits" and "misses" (ChunkCache/ResponseCache.stats).
+    previous_lookups = CACHE_LOOKUPS._function
+    previous_ratio = CACHE_HIT_RATE._function
+
+    def lookups():
+        values = previous_lookups() if previous_lookups else {}
+        stats = stats_fn()
+        values[(name, "hit")] = stats["hits"]
+        values[(name, "miss")] = stats["misses"]
+        return values
+
+    def ratio():
+        values = previous_ratio() if previous_ratio else {}
+        stats = stats_fn()
+        total = stats["hits"] + stats["misses"]
+        values[(name,)] = stats["hits"] / total if total else 0.0
+        return values
+
+    CACHE_LOOKUPS.set_function(lookups)
+    CACHE_HIT_RATE.set_function(ratio)
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from mcq_generation.config import MODEL_NAME, ONNX_CACHE_DIR
+
+# One copy of the e5 weights per process. The SentenceTransformer wrapper owns the
+# transformers model and tokenizer, so the chunker, Chroma, KeyBERT and
+# semantic_cluster.embed_manual all run on the same tensors.
+_lock = threading.RLock()
+_sentence_model = None
+_kw_model = None
+_embeddings = None
+_quantized_model = None
+_onnx_session = None
+
+_metrics = {
+    "model_name": MODEL_NAME,
+    "loaded": False,
+    "load_seconds": None,
+    "keybert_load_seconds": None,
+    "parameters": 0,
+    "weights_bytes": 0,
+    "rss_before_bytes": None,
+    "rss_after_bytes": None,
+}
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_sentence_model():
+    global _sentence_model
+    if _sentence_model is not None:
+        return _sentence_model
+
+    with _lock:
+        if _sentence_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            rss_before = _current_rss_bytes()
+            start = time.perf_counter()
+            sentence_model = SentenceTransformer(MODEL_NAME)
+            sentence_model.eval()
+            elapsed = time.perf_counter() - start
+
+            auto_model = sentence_model[0].auto_model
+            _metrics["loaded"] = True
+            _metrics["load_seconds"] = round(elapsed, 3)
+            _metrics["parameters"] = sum(p.numel() for p in auto_model.parameters())
+            _metrics["weights_bytes"] = sum(
+                p.numel() * p.element_size() for p in auto_model.parameters()
+            )
+            _metrics["rss_before_bytes"] = rss_before
+            _metrics["rss_after_bytes"] = _current_rss_bytes()
+            print(f" Loaded {MODEL_NAME} in {elapsed:.2f}s")
+
+            _sentence_model = sentence_model
+    return _sentence_model
+
+
+def get_model():
+    return get_sentence_model()[0].auto_model
+
+
+def get_tokenizer():
+    return get_sentence_model()[0].tokenizer
+
+
+def _cpu_model():
+    # Dynamic quantisation and the ONNX export only work on CPU weights; a model
+    # the sentence-transformers loader put on a GPU is copied to the CPU first.
+    import copy
+
+    model = get_model()
+    if model.device.type == "cpu":
+        return model
+    return copy.deepcopy(model).to("cpu").eval()
+
+
+def get_quantized_model():
+    global _quantized_model
+    if _quantized_model is not None:
+        return _quantized_model
+
+    with _lock:
+        if _quantized_model is None:
+            import torch
+
+            start = time.perf_counter()
+            _quantized_model = torch.quantization.quantize_dynamic(
+                _cpu_model(), {torch.nn.Linear}, dtype=torch.qint8
+            )
+            _quantized_model.eval()
+            _metrics["int8_load_seconds"] = round(time.perf_counter() - start, 3)
+    return _quantized_model
+
+
+def _export_onnx(onnx_path):
+    import torch
+
+    model = _cpu_model()
+    tokenizer = get_tokenizer()
+    sample = tokenizer(["passage: warm up"], return_tensors="pt")
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    tmp_path = f"{onnx_path}.tmp"
+    # no_grad rather than inference_mode: the exporter traces the model, and
+    # inference tensors cannot be recorded by the tracer.
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+        )
+    os.replace(tmp_path, onnx_path)
+
+
+def get_onnx_session():
+    global _onnx_session
+    if _onnx_session is not None:
+        return _onnx_session
+
+    with _lock:
+        if _onnx_session is None:
+            import onnxruntime as ort
+
+            start = time.perf_counter()
+            onnx_path = os.path.join(ONNX_CACHE_DIR, MODEL_NAME.replace("/", "__") + ".onnx")
+            if not os.path.isfile(onnx_path):
+                print(f" Exporting {MODEL_NAME} to {onnx_path}")
+                _export_onnx(onnx_path)
+            _onnx_session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+            _metrics["onnx_load_seconds"] = round(time.perf_counter() - start, 3)
+    return _onnx_session
+
+
+class SharedEmbeddings(Embeddings):
+    """LangChain embeddings backed by the process-wide e5 model."""
+
+    def __init__(self, normalize: bool = True):
+        self.normalize = normalize
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = get_sentence_model().encode(
+            list(texts), normalize_embeddings=self.normalize
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = SharedEmbeddings()
+    return _embeddings
+
+
+def get_kw_model():
+    global _kw_model
+    if _kw_model is not None:
+        return _kw_model
+
+    with _lock:
+        if _kw_model is None:
+            from keybert import KeyBERT
+
+            start = time.perf_counter()
+            _kw_model = KeyBERT(model=get_sentence_model())
+            _metrics["keybert_load_seconds"] = round(time.perf_counter() - start, 3)
+    return _kw_model
+
+
+def warm_up():
+    get_sentence_model()
+    get_embeddings()
+    get_kw_model()
+    return get_metrics()
+
+
+def get_metrics() -> Dict:
+    metrics = dict(_metrics)
+    metrics["rss_bytes"] = _current_rss_bytes()
+    return metrics
@@ -0,0 +1,22 @@
+from mcq_generation.chunk_files import load_and_embed_pdfs
+from mcq_generation.semantic_cluster import cluster_chunks
+
+
+def ingest_files(file_paths):
+    return load_and_embed_pdfs(file_paths)
+
+
+def cluster_records(chunks, embeddings, k=8):
+    # The cluster_chunks records: merged text, centroid and source chunk indices.
+    if not chunks:
+        return []
+    return cluster_chunks(chunks, k=k, embeddings=embeddings)
+
+
+def cluster_contexts(chunks, embeddings, k=8):
+    return [cluster["text"] for cluster in cluster_records(chunks, embeddings, k=k)]
+
+
+def build_contexts(file_paths, k=8):
+    chunks, embeddings = ingest_files(file_paths)
+    return cluster_contexts(chunks, embeddings, k=k)
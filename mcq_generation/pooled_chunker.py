@@ -0,0 +1,105 @@
+import copy
+import re
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _RecordingEmbeddings(Embeddings):
+    # Passes calls through to the shared model and keeps the last batch of
+    # sentence vectors for the calling thread, so the chunker can reuse them.
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+        self._local = threading.local()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.inner.embed_documents(texts)
+        self._local.last = vectors
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    def take(self) -> Optional[List[List[float]]]:
+        vectors = getattr(self._local, "last", None)
+        self._local.last = None
+        return vectors
+
+
+def _group_end(sentences, start, chunk):
+    # SemanticChunker emits " ".join(sentences[start:end]); returns that end, or
+    # None if the chunk is not the next run of sentences.
+    length = -1
+    for end in range(start + 1, len(sentences) + 1):
+        length += len(sentences[end - 1]) + 1
+        if length >= len(chunk):
+            return end if length == len(chunk) and " ".join(sentences[start:end]) == chunk else None
+    return None
+
+
+class PooledSemanticChunker(SemanticChunker):
+    """SemanticChunker that also hands back one vector per chunk.
+
+    Finding breakpoints already embeds every sentence (with its neighbours). A
+    chunk's vector is the normalised mean of its sentences' vectors, so chunks do
+    not go through the model again for clustering or indexing. The vectors live
+    in the same space as the `embeddings` passed in, which is what Chroma uses for
+    queries.
+    """
+
+    def __init__(self, embeddings: Embeddings, **kwargs):
+        self._recorder = _RecordingEmbeddings(embeddings)
+        super().__init__(embeddings=self._recorder, **kwargs)
+        self.pooled_chunks = 0
+        self.embedded_chunks = 0
+
+    def _embed_directly(self, texts):
+        self.embedded_chunks += len(texts)
+        return _unit(np.asarray(self._recorder.inner.embed_documents(texts), dtype=np.float32))
+
+    def split_text_with_vectors(self, text: str) -> Tuple[List[str], np.ndarray]:
+        self._recorder.take()
+        texts = self.split_text(text)
+        if not texts:
+            return texts, None
+        sentence_vectors = self._recorder.take()
+        sentences = re.split(self.sentence_split_regex, text)
+        # Texts too short for a breakpoint search are returned without embedding
+        # anything; those few chunks are embedded here instead.
+        if sentence_vectors is None or len(sentence_vectors) != len(sentences):
+            return texts, self._embed_directly(texts)
+
+        sentence_vectors = np.asarray(sentence_vectors, dtype=np.float32)
+        pooled = []
+        start = 0
+        for chunk in texts:
+            end = _group_end(sentences, start, chunk)
+            if end is None:
+                return texts, self._embed_directly(texts)
+            pooled.append(sentence_vectors[start:end].mean(axis=0))
+            start = end
+        self.pooled_chunks += len(texts)
+        return texts, _unit(np.stack(pooled))
+
+    def split_documents_with_vectors(self, documents) -> Tuple[List[Document], Optional[np.ndarray]]:
+        # Same chunks as split_documents, plus a row-aligned vector matrix.
+        chunks = []
+        vectors = []
+        for document in documents:
+            texts, text_vectors = self.split_text_with_vectors(document.page_content)
+            chunks.extend(
+                Document(page_content=text, metadata=copy.deepcopy(document.metadata)) for text in texts
+            )
+            if texts:
+                vectors.append(text_vectors)
+        return chunks, np.concatenate(vectors, axis=0) if vectors else None
@@ -1,11 +1,9 @@
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableMap
+from langchain_core.runnables import RunnableLambda
 from langchain.schema import StrOutputParser
-from langchain.chains import RetrievalQA
-from langchain_ollama import OllamaLLM
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 from dotenv import load_dotenv
+from mcq_generation.config import RAG_QUERY_REWRITE
 
 
 load_dotenv()
@@ -56,30 +54,35 @@ Answer:
     )
 
 
-def setup_rag(vectorstore):
-    llm = ChatGoogleGenerativeAI(
+def setup_rag(vectorstore, rewrite=RAG_QUERY_REWRITE):
+    # Retrieval is hybrid BM25 + dense (retrieval.py), which handles Romanian
+    # terms without an LLM round trip; rewrite=True puts the multilingual
+    # rewrite back in front of it, cached per question.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from mcq_generation.llm_cache import with_response_cache
+    from mcq_generation.retrieval import get_hybrid_retriever
+
+    llm = with_response_cache(ChatGoogleGenerativeAI(
         model="gemini-2.0-flash",
         temperature=0.2,
         max_output_tokens=1024
-    )
-
-    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 10, "fetch_k": 20})
+    ))
 
-    rewrite_chain = prompt_rewrite | llm | StrOutputParser()
+    retriever = get_hybrid_retriever(vectorstore, k=10)
     answer_chain = react_prompt | llm | StrOutputParser()
-
-    full_chain = (
-    {"query": RunnablePassthrough()}
-    | RunnableMap({"query": rewrite_chain})
-    | (lambda rewritten: (
-        print(f"Rewritten Query: \n {repr(rewritten['query'])}\n"),
-        {
-        "query": rewritten["query"],
-        "context": "\n\n".join([doc.page_content for doc in retriever.invoke(rewritten["query"])])
+    # The retriever is shared per collection, so the rewriter stays with this chain.
+    rewriter = prompt_rewrite | llm | StrOutputParser() if rewrite else None
+
+    def retrieve(query):
+        search_query = retriever.rewrite(query, rewriter)
+        if search_query != query:
+            print(f"Rewritten Query: \n {repr(search_query)}\n")
+        return {
+            "query": search_query,
+            "context": "\n\n".join([doc.page_content for doc in retriever.invoke(search_query)]),
         }
-    )[1])
-    | answer_chain
-)
+
+    full_chain = RunnableLambda(retrieve) | answer_chain
 
     return full_chain
 
@@ -0,0 +1,261 @@
+import math
+import re
+import threading
+import unicodedata
+import weakref
+from collections import Counter, OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+
+from mcq_generation.config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_FETCH_K
+from mcq_generation.metrics import span
+
+# Hybrid retrieval for the RAG path: an in-process BM25 index over the chunk
+# texts and the dense chunk vectors, fused with reciprocal rank fusion. The
+# tokeniser folds diacritics and also indexes a short prefix of every long word,
+# so "registrul"/"registre"/"register" or "criptare"/"criptografie" share a
+# term. That lets Romanian material match English questions lexically, which
+# is what the LLM query rewrite was for. Rewrites, query vectors and results
+# are memoised, so a repeated question is answered from memory.
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal rank fusion constant (Cormack et al. use 60).
+RRF_K = 60
+# Words longer than this also index their first PREFIX_CHARS characters.
+PREFIX_CHARS = 5
+
+_TOKEN = re.compile(r"\w+")
+
+
+def fold(text):
+    # Lower-case, without diacritics: "Științe" -> "stiinte", "ţ" and "ț" -> "t".
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stop_words():
+    from mcq_generation.topics import STOP_WORDS
+
+    return frozenset(fold(word) for word in STOP_WORDS)
+
+
+_STOP_WORDS = None
+
+
+def tokenize(text):
+    global _STOP_WORDS
+    if _STOP_WORDS is None:
+        _STOP_WORDS = _stop_words()
+    tokens = []
+    for word in _TOKEN.findall(fold(text)):
+        if len(word) < 2 or word in _STOP_WORDS:
+            continue
+        tokens.append(word)
+        if len(word) > PREFIX_CHARS and not word.isdigit():
+            tokens.append(word[:PREFIX_CHARS] + "*")
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts, as inverted postings in numpy arrays."""
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings = {}
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(tf)
+        average = float(lengths.mean()) if self.size else 0.0
+        # Length normalisation is per document, so it is folded in once here.
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / max(average, 1e-9))
+        self._postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        self._idf = {
+            term: math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in postings.items()
+        }
+
+    def scores(self, query):
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            ids, tfs = self._postings[term]
+            scores[ids] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        return scores
+
+
+class LRUCache:
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def _top(scores, n):
+    n = min(n, len(scores))
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    fused = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda i: (-fused[i], i))
+
+
+def rewriter_key(rewriter):
+    # The model(s) a rewriter runs, e.g. "ChatGoogleGenerativeAI:gemini-2.0-flash".
+    models = [step for step in getattr(rewriter, "steps", [rewriter]) if isinstance(step, BaseLanguageModel)]
+    if not models:
+        return f"{type(rewriter).__name__}:{id(rewriter)}"
+    return "|".join(
+        f"{type(model).__name__}:{getattr(model, 'model', None) or getattr(model, 'model_name', '')}"
+        for model in models
+    )
+
+
+class HybridRetriever:
+    """BM25 + dense retrieval over one material's chunks, with memoised queries.
+
+    `vectors` are the chunk vectors in the query embedding space (pooled chunk
+    vectors or the ones Chroma stored); without them the chunks are embedded
+    once here. invoke(query) returns Documents like a LangChain retriever.
+
+    One instance is shared by every caller of a collection (get_hybrid_retriever),
+    so it holds no per-caller settings: a query rewriter (a prompt | model |
+    parser runnable) is passed per call, and its answers are cached per model
+    and question.
+    """
+
+    def __init__(self, chunks, vectors=None, embeddings=None, k=10, fetch_k=RETRIEVAL_FETCH_K,
+                 cache_size=RETRIEVAL_CACHE_SIZE):
+        if embeddings is None:
+            from mcq_generation.model_registry import get_embeddings
+
+            embeddings = get_embeddings()
+        self.chunks = list(chunks)
+        self.embeddings = embeddings
+        self.k = k
+        self.fetch_k = fetch_k
+        texts = [chunk.page_content for chunk in self.chunks]
+        if vectors is None:
+            vectors = embeddings.embed_documents(texts) if texts else np.zeros((0, 1))
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+        self.bm25 = BM25Index(texts)
+        self.rewrites = LRUCache(cache_size)
+        self.query_vectors = LRUCache(cache_size)
+        self.results = LRUCache(cache_size)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, **kwargs):
+        # Reuses the texts and vectors already in the Chroma collection.
+        stored = vectorstore.get(include=["documents", "metadatas", "embeddings"])
+        chunks = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        ]
+        vectors = stored["embeddings"] if len(stored["ids"]) else None
+        return cls(chunks, vectors=vectors, embeddings=vectorstore.embeddings, **kwargs)
+
+    def rewrite(self, query, rewriter=None):
+        # Every caller rewrites with rag.prompt_rewrite, but not with the same model.
+        if rewriter is None:
+            return query
+        key = (rewriter_key(rewriter), query)
+        return self.rewrites.get_or_compute(key, lambda: rewriter.invoke(query).strip() or query)
+
+    def _query_vector(self, query):
+        def compute():
+            vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+        return self.query_vectors.get_or_compute(query, compute)
+
+    def rank(self, query, k=None):
+        # Chunk indices, best first.
+        k = k or self.k
+        if not self.chunks:
+            return []
+        lexical_scores = self.bm25.scores(query)
+        lexical = _top(lexical_scores, self.fetch_k)
+        # Chunks sharing no term with the query are not a lexical match at all.
+        lexical = lexical[lexical_scores[lexical] > 0]
+        dense = _top(self.vectors @ self._query_vector(query), self.fetch_k)
+        return reciprocal_rank_fusion([lexical, dense])[:k]
+
+    def invoke(self, query, k=None, rewriter=None):
+        k = k or self.k
+        with span("retrieve.hybrid", cached=False) as attributes:
+            search_query = self.rewrite(query, rewriter)
+            hits = self.results.hits
+            ranking = self.results.get_or_compute((search_query, k), lambda: tuple(self.rank(search_query, k)))
+            attributes["cached"] = self.results.hits > hits
+        return [self.chunks[i] for i in ranking]
+
+    def stats(self):
+        return {
+            "chunks": len(self.chunks),
+            "terms": len(self.bm25._postings),
+            "rewrites": self.rewrites.stats(),
+            "query_vectors": self.query_vectors.stats(),
+            "results": self.results.stats(),
+        }
+
+
+# Keyed by the vectorstore itself: embedder.open_vectorstore hands out one
+# instance per collection.
+_retrievers = weakref.WeakKeyDictionary()
+_retrievers_lock = threading.Lock()
+
+
+def get_hybrid_retriever(vectorstore, **kwargs):
+    # One retriever per collection, rebuilt when the collection's size changes,
+    # so its caches outlive a single request. kwargs apply only when building.
+    size = len(vectorstore.get(include=[])["ids"])
+    with _retrievers_lock:
+        retriever = _retrievers.get(vectorstore)
+        if retriever is not None and retriever[0] == size:
+            return retriever[1]
+    built = HybridRetriever.from_vectorstore(vectorstore, **kwargs)
+    with _retrievers_lock:
+        _retrievers[vectorstore] = (size, built)
+    return built
@@ -1,53 +1,105 @@
-from typing import List
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Dict, List
+from sklearn.cluster import KMeans, MiniBatchKMeans
 import numpy as np
-import torch
-from mcq_generation.config import model, tokenizer
+from mcq_generation.embedding_engine import embed_texts
+from mcq_generation.metrics import span
 
+MIN_CHUNK_WORDS = 10
+MIN_CONTEXT_WORDS = 20
+COHERENCE_THRESHOLD = 0.55
+# Above this many chunks KMeans is swapped for MiniBatchKMeans unless told otherwise.
+MINIBATCH_THRESHOLD = 5000
+RANDOM_STATE = 42
 
-def embed_manual(texts):
-    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    embeddings = outputs.last_hidden_state[:, 0, :]
-    return torch.nn.functional.normalize(embeddings, p=2, dim=1).cpu().numpy()
+
+def embed_manual(texts, batch_size=None, backend=None):
+    return embed_texts(texts, batch_size=batch_size, backend=backend)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
 
 
 def score_cluster(embeddings):
-    cluster_center = np.mean(embeddings, axis=0, keepdims=True)
-    sims = cosine_similarity(embeddings, cluster_center)
-    return np.mean(sims)
+    embeddings = _unit(np.asarray(embeddings))
+    center = _unit(embeddings.mean(axis=0))
+    return float(np.mean(embeddings @ center))
 
 
 def select_top_k_chunks(cluster_chunks, cluster_embeds, k=3):
-    center = np.mean(cluster_embeds, axis=0, keepdims=True)
-    sims = cosine_similarity(cluster_embeds, center).flatten()
+    cluster_embeds = _unit(np.asarray(cluster_embeds))
+    sims = cluster_embeds @ _unit(cluster_embeds.mean(axis=0))
     top_indices = np.argsort(sims)[-k:]
     return "\n\n".join([cluster_chunks[i].page_content for i in top_indices])
 
 
-def retrieve_diverse_chunks(chunks: List, k: int = 5) -> List:
-    contents = [chunk.page_content for chunk in chunks if len(chunk.page_content.split()) > 10]
-    chunks = [chunk for chunk in chunks if len(chunk.page_content.split()) > 10]
-    embeddings = embed_manual(contents)
+def fit_labels(embeddings, k, minibatch=None, random_state=RANDOM_STATE):
+    if minibatch is None:
+        minibatch = len(embeddings) > MINIBATCH_THRESHOLD
+    if minibatch:
+        kmeans = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init="auto", batch_size=1024)
+    else:
+        kmeans = KMeans(n_clusters=k, random_state=random_state, n_init="auto")
+    return kmeans.fit_predict(embeddings)
+
+
+def cluster_chunks(chunks: List, k: int = 5, embeddings=None, minibatch=None, top_k: int = 3) -> List[Dict]:
+    # Groups chunks into k clusters and returns one record per coherent cluster:
+    # the merged text of its top_k most central chunks, its unit centroid and the
+    # indices (into `chunks`) of the selected chunks.
+    keep = np.array([len(chunk.page_content.split()) > MIN_CHUNK_WORDS for chunk in chunks], dtype=bool)
+    kept_indices = np.flatnonzero(keep)
+    if embeddings is None:
+        embeddings = embed_manual([chunks[i].page_content for i in kept_indices])
+    else:
+        embeddings = np.asarray(embeddings)[keep]
+    if len(kept_indices) == 0:
+        return []
 
-    k = min(k, len(chunks))
-    kmeans = KMeans(n_clusters=k, random_state=42, n_init="auto")
-    labels = kmeans.fit_predict(embeddings)
+    embeddings = _unit(np.asarray(embeddings, dtype=np.float32))
+    k = min(k, len(kept_indices))
+    with span("cluster", chunks=len(kept_indices), k=k):
+        labels = fit_labels(embeddings, k, minibatch=minibatch)
 
-    diverse_chunks = []
-    for label in set(labels):
-        cluster_chunks = [chunks[i] for i in range(len(chunks)) if labels[i] == label]
-        cluster_embeds = [embeddings[i] for i in range(len(chunks)) if labels[i] == label]
+    # Group rows by label once (stable argsort + bincount) instead of rescanning
+    # every chunk for every cluster.
+    counts = np.bincount(labels, minlength=k)
+    order = np.argsort(labels, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    sums = np.zeros((k, embeddings.shape[1]), dtype=embeddings.dtype)
+    sums[nonempty] = np.add.reduceat(embeddings[order], starts[nonempty], axis=0)
+    centroids = _unit(sums / np.maximum(counts, 1)[:, None])
+    sims = np.einsum("ij,ij->i", embeddings, centroids[labels])
+    scores = np.bincount(labels, weights=sims, minlength=k) / np.maximum(counts, 1)
 
-        if score_cluster(cluster_embeds) > 0.55:
-            merged_chunk = select_top_k_chunks(cluster_chunks, cluster_embeds, k=3)
-            if merged_chunk.strip().isdigit() or len(merged_chunk.split()) < 20:
-                print(f" Skipping cluster {label}: weak or too short content")
-                continue
-            diverse_chunks.append(merged_chunk)
-        else:
+    clusters = []
+    for label in range(k):
+        if counts[label] == 0:
+            continue
+        if scores[label] <= COHERENCE_THRESHOLD:
             print(f" Skipping low-coherence cluster {label}")
+            continue
+
+        members = order[starts[label]:starts[label] + counts[label]]
+        top = members[np.argsort(sims[members])[-top_k:]]
+        merged_chunk = "\n\n".join(chunks[kept_indices[i]].page_content for i in top)
+        if merged_chunk.strip().isdigit() or len(merged_chunk.split()) < MIN_CONTEXT_WORDS:
+            print(f" Skipping cluster {label}: weak or too short content")
+            continue
+
+        clusters.append({
+            "label": int(label),
+            "text": merged_chunk,
+            "centroid": centroids[label],
+            "score": float(scores[label]),
+            "size": int(counts[label]),
+            "chunk_indices": [int(kept_indices[i]) for i in top],
+        })
+
+    return clusters
+
 
-    return diverse_chunks
+def retrieve_diverse_chunks(chunks: List, k: int = 5, embeddings=None, minibatch=None) -> List:
+    return [cluster["text"] for cluster in cluster_chunks(chunks, k=k, embeddings=embeddings, minibatch=minibatch)]
@@ -0,0 +1,38 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from mcq_generation.metrics import span
+
+
+class StageTimings:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.counts[name] += 1
+
+    def timed_iter(self, name, iterable):
+        # Charges the time spent producing each item of a lazy iterable to `name`.
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self):
+        return {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+
+    def report(self, title="Stage timings"):
+        print(f" {title}: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.seconds.items()))
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, CountVectorizer
+
+from mcq_generation.config import CHUNK_VECTORS, TOPIC_CACHE_MATERIALS
+
+# KeyBERT-style topic labels computed from the cluster centroids that
+# semantic_cluster.cluster_chunks already returns: candidate n-grams are
+# extracted per cluster, embedded for all clusters in one batch, and ranked by
+# cosine similarity to the centroid. Candidate vectors are cached per material,
+# so relabelling the same material only embeds n-grams it has not seen yet.
+
+NGRAM_RANGE = (1, 2)
+UNKNOWN_TOPIC = "Unknown"
+
+ROMANIAN_STOP_WORDS = frozenset("""
+a acea aceasta această aceea acei aceia acel acela acele acelea acest acesta aceste acestea acestei
+acestor acolo acum ai aia aibă al ale alt alta altceva altcineva alte altfel alți am ar are as asa
+asta astea ăsta ăstea atât atâta atât atunci au avea avem aveți azi bine ca că căci cand când care
+căreia cărora căruia cât câte câți ce cea ceea cei ceilalți cel cele celor ceva chiar cine cineva
+cu cum da dacă dar de deci deja deși despre din dintre doar după ea ei el ele era erau este eu fi
+fie fiecare fost fără iar în încât între într intr îl îmi îi la le li lor lui mai mult multe
+mulți ne nici nimic niciun nicio noi nostru nu o oare ori pe pentru peste poate pot prea prin
+sa să se sau său sub sunt și şi ta tale te tot toate toți tu un una unde unei unele uneori unii
+unor unui unul vă voi vom vor
+""".split())
+
+STOP_WORDS = list(ENGLISH_STOP_WORDS | ROMANIAN_STOP_WORDS)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _embed_candidates(candidates):
+    # Candidates have to live in the same space as the centroids: the shared
+    # sentence-transformers model for pooled chunk vectors, CLS otherwise.
+    if CHUNK_VECTORS == "pooled":
+        from mcq_generation.model_registry import get_embeddings
+
+        return np.asarray(get_embeddings().embed_documents(candidates), dtype=np.float32)
+    from mcq_generation.embedding_engine import embed_texts
+
+    return embed_texts(candidates)
+
+
+def candidate_ngrams(text, ngram_range=NGRAM_RANGE):
+    try:
+        vectorizer = CountVectorizer(ngram_range=ngram_range, stop_words=STOP_WORDS).fit([text])
+    except ValueError:
+        # Empty vocabulary: nothing but stop words, numbers or punctuation.
+        return []
+    return list(vectorizer.get_feature_names_out())
+
+
+class TopicCache:
+    # {material key: {n-gram: unit vector}}, keeping the most recently used materials.
+
+    def __init__(self, max_materials=TOPIC_CACHE_MATERIALS):
+        self.max_materials = max_materials
+        self.hits = 0
+        self.misses = 0
+        self._materials = OrderedDict()
+        self._lock = threading.Lock()
+
+    def vectors_for(self, material, candidates):
+        with self._lock:
+            cached = self._materials.setdefault(material, {})
+            self._materials.move_to_end(material)
+            while len(self._materials) > self.max_materials:
+                self._materials.popitem(last=False)
+            missing = [c for c in dict.fromkeys(candidates) if c not in cached]
+            self.hits += len(candidates) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = _unit(_embed_candidates(missing))
+            with self._lock:
+                cached.update(zip(missing, vectors))
+        return np.stack([cached[c] for c in candidates]) if candidates else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "materials": len(self._materials),
+                "ngrams": sum(len(v) for v in self._materials.values()),
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_topic_cache():
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = TopicCache()
+    return _default_cache
+
+
+def label_clusters(clusters, material=None, top_n=1, cache=None):
+    # clusters are cluster_chunks records ("text" and "centroid"). Returns one
+    # label per cluster: its top_n candidates joined with ", ", or "Unknown".
+    # Without a material key nothing is kept beyond this call.
+    if cache is None:
+        cache = get_topic_cache() if material is not None else TopicCache(max_materials=1)
+    per_cluster = [candidate_ngrams(cluster["text"]) for cluster in clusters]
+    all_candidates = list(dict.fromkeys(c for candidates in per_cluster for c in candidates))
+    if not all_candidates:
+        return [UNKNOWN_TOPIC] * len(clusters)
+
+    # One embedding call for every new n-gram across all clusters.
+    vectors = cache.vectors_for(material, all_candidates)
+    position = {candidate: i for i, candidate in enumerate(all_candidates)}
+
+    labels = []
+    for cluster, candidates in zip(clusters, per_cluster):
+        if not candidates:
+            labels.append(UNKNOWN_TOPIC)
+            continue
+        rows = vectors[[position[c] for c in candidates]]
+        scores = rows @ _unit(np.asarray(cluster["centroid"], dtype=np.float32))
+        best = np.argsort(scores)[::-1][:top_n]
+        labels.append(", ".join(candidates[i] for i in best))
+    return labels
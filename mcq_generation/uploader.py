@@ -1,8 +1,109 @@
+import hashlib
+import json
 import os
+import re
+import tempfile
+import threading
+
+# Uploads are copied in fixed-size blocks and hashed on the way to disk, then
+# stored content-addressed under <upload_dir>/blobs/<aa>/<sha256><ext>. The same
+# bytes uploaded twice, under any name, end up in one blob, and the second
+# upload gets back the fingerprint (sha256) of the first. The fingerprint is the
+# same hash the chunk cache keys on, so a duplicate reuses its chunks,
+# embeddings and everything downstream.
+
+UPLOAD_BLOCK_SIZE = 1 << 20
+BLOB_DIR = "blobs"
+INDEX_FILE = "index.json"
+
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+_index_lock = threading.Lock()
+
+
+def _blob_path(upload_dir, digest, extension):
+    return os.path.join(upload_dir, BLOB_DIR, digest[:2], digest + extension)
+
+
+def blob_sha256(file_path):
+    # The fingerprint of a blob written by store_upload, read off its name; None
+    # for any other file. Blobs are never rewritten, so the name stays valid.
+    parent = os.path.dirname(file_path)
+    match = _BLOB_NAME.match(os.path.basename(file_path))
+    if not match or os.path.basename(os.path.dirname(parent)) != BLOB_DIR:
+        return None
+    digest = match.group(1)
+    return digest if os.path.basename(parent) == digest[:2] else None
+
+
+def _read_index(upload_dir):
+    try:
+        with open(os.path.join(upload_dir, INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record(upload_dir, digest, record, filename):
+    # {sha256: {"path", "size", "names"}}, rewritten atomically.
+    with _index_lock:
+        index = _read_index(upload_dir)
+        entry = index.setdefault(digest, {"path": record["path"], "size": record["size"], "names": []})
+        if filename and filename not in entry["names"]:
+            entry["names"].append(filename)
+        tmp_path = os.path.join(upload_dir, INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(upload_dir, INDEX_FILE))
+        return entry["names"]
+
+
+def store_upload(file, upload_dir="example_data", block_size=UPLOAD_BLOCK_SIZE):
+    # file is any object with read(n) and an optional filename (werkzeug's
+    # FileStorage, an open file). Returns {"path", "sha256", "size", "filename",
+    # "duplicate", "names"}; names are every filename seen for this content.
+    filename = os.path.basename(getattr(file, "filename", "") or "")
+    extension = os.path.splitext(filename)[1].lower()
+    os.makedirs(os.path.join(upload_dir, BLOB_DIR), exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    # Written next to the blobs so the final rename stays on one filesystem.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.join(upload_dir, BLOB_DIR), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+        sha256 = digest.hexdigest()
+        existing = lookup(upload_dir, sha256)
+        # The first upload's blob wins, whatever extension this copy came with.
+        if existing and os.path.exists(existing["path"]):
+            path = existing["path"]
+        else:
+            path = _blob_path(upload_dir, sha256, extension)
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    record = {"path": path, "sha256": sha256, "size": size, "filename": filename, "duplicate": duplicate}
+    record["names"] = _record(upload_dir, sha256, record, filename)
+    if duplicate:
+        print(f" Upload {filename or '<unnamed>'} is a duplicate of {sha256[:12]}")
+    return record
+
+
+def lookup(upload_dir, sha256):
+    # The index entry for a fingerprint, or None if it was never uploaded.
+    return _read_index(upload_dir).get(sha256)
+
 
 def save_uploaded_file(file, upload_dir="example_data"):
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(file.read())
-    return file_path
\ No newline at end of file
+    return store_upload(file, upload_dir)["path"]
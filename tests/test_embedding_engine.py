@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+# Loads the real e5 model and exports it to ONNX once; skipped where the
+# embedding stack is not installed.
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from mcq_generation import embedding_engine, model_registry
+
+TEXTS = [
+    "Photosynthesis converts light energy into chemical energy.",
+    "La photosynthèse a lieu dans les chloroplastes.",
+    "Mitochondria",
+    "The Calvin cycle fixes carbon dioxide into three-carbon sugars using ATP and NADPH.",
+]
+
+
+@pytest.fixture
+def onnx_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "ONNX_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(model_registry, "_onnx_session", None)
+
+
+def test_onnx_embeddings_match_torch(onnx_cache):
+    expected = embedding_engine.embed_texts(TEXTS, batch_size=2, backend="torch")
+    actual = embedding_engine.embed_texts(TEXTS, batch_size=2, backend="onnx")
+
+    assert actual.shape == expected.shape
+    # Both are L2-normalised, so the row-wise dot product is the cosine similarity.
+    assert np.einsum("ij,ij->i", actual, expected) == pytest.approx(1.0, abs=1e-3)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from mcq_generation import llm_executor
+from mcq_generation.fake_llm import FakeMCQLLM
+from mcq_generation.llm_executor import RateLimiter, TokenBucket, invoke_with_retry, run_clusters
+
+PROMPT = PromptTemplate(input_variables=["context"], template="Context:\n{context}")
+
+
+def fake_chain(**kwargs):
+    return PROMPT | FakeMCQLLM(**kwargs) | StrOutputParser()
+
+
+def unlimited():
+    return RateLimiter(requests_per_minute=1e9, tokens_per_minute=1e12)
+
+
+def test_bucket_spaces_reservations_at_its_rate():
+    bucket = TokenBucket(per_minute=600, capacity=1)
+    waits = [bucket.reserve(1) for _ in range(4)]
+    assert waits[0] == 0.0
+    # 10 per second: each further call waits 0.1 s longer than the one before.
+    for i, wait in enumerate(waits[1:], start=1):
+        assert wait == pytest.approx(0.1 * i, abs=0.02)
+
+
+def test_limiter_spaces_calls_out():
+    limiter = RateLimiter(tokens_per_minute=1e12)
+    limiter.requests = TokenBucket(per_minute=1200, capacity=1)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # The first call is free, the next four wait 1/20 s each.
+    assert time.monotonic() - started >= 0.18
+    assert limiter.waited_seconds == pytest.approx(0.2, abs=0.03)
+
+
+def test_rate_limit_errors_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_executor.time, "sleep", delays.append)
+    chain = fake_chain(rate_limit_every=2)
+
+    first = invoke_with_retry(chain, {"context": "first"}, limiter=unlimited(), base_delay=1.0)
+    # The second call gets a 429 and the retry (third call) succeeds.
+    second = invoke_with_retry(chain, {"context": "second"}, limiter=unlimited(), base_delay=1.0)
+
+    assert first.startswith("STEM:") and second.startswith("STEM:")
+    assert len(delays) == 1
+    assert 0.5 <= delays[0] <= 1.0
+
+
+def test_backoff_grows_and_gives_up_after_max_retries(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_executor.time, "sleep", delays.append)
+    chain = fake_chain(rate_limit_every=1)
+
+    with pytest.raises(RuntimeError, match="429"):
+        invoke_with_retry(chain, {"context": "x"}, limiter=unlimited(), max_retries=3, base_delay=1.0, max_delay=3.0)
+
+    assert len(delays) == 3
+    # Jittered between half and all of min(max_delay, base_delay * 2 ** attempt).
+    for attempt, delay in enumerate(delays):
+        cap = min(3.0, 2 ** attempt)
+        assert cap / 2 <= delay <= cap
+
+
+def test_non_rate_limit_errors_are_not_retried(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_executor.time, "sleep", delays.append)
+
+    class Broken:
+        def invoke(self, inputs):
+            raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        invoke_with_retry(Broken(), {}, limiter=unlimited())
+    assert delays == []
+
+
+def test_run_clusters_keeps_cluster_order():
+    contexts = [f"context {i}" for i in range(8)]
+    chain = fake_chain()
+
+    def generate(context):
+        # Later clusters finish first.
+        time.sleep(0.01 * (len(contexts) - int(context.split()[1])))
+        return context, invoke_with_retry(chain, {"context": context}, limiter=unlimited())
+
+    results = run_clusters(contexts, generate_fn=generate, max_concurrency=4)
+
+    assert [context for context, _ in results] == contexts
+    assert all(output.startswith("STEM:") for _, output in results)
+
+
+def test_failing_cluster_does_not_abort_the_others():
+    contexts = ["a", "b", "bad", "c"]
+    chain = fake_chain()
+    finished = {}
+    lock = threading.Lock()
+
+    def generate(context):
+        if context == "bad":
+            raise ValueError("no MCQ in the output")
+        return invoke_with_retry(chain, {"context": context}, limiter=unlimited())
+
+    errors = []
+
+    def on_result(index, result):
+        with lock:
+            finished[index] = result
+
+    def on_error(index, error):
+        errors.append((index, error))
+
+    results = run_clusters(contexts, generate_fn=generate, max_concurrency=2, on_result=on_result, on_error=on_error)
+
+    assert results[2] is None
+    assert all(results[i] for i in (0, 1, 3))
+    assert sorted(finished) == [0, 1, 2, 3]
+    assert finished[2] is None
+    assert [(index, str(error)) for index, error in errors] == [(2, "no MCQ in the output")]
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from mcq_api.repository import QuizRepository
+
+SCHEMA = """
+CREATE TABLE materials (materialID TEXT PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE quizzes (
+    quizId TEXT PRIMARY KEY,
+    materialID TEXT NOT NULL,
+    question TEXT NOT NULL CHECK (question != ''),
+    optionA TEXT, optionB TEXT, optionC TEXT, optionD TEXT,
+    correctOption TEXT NOT NULL
+);
+"""
+
+
+def mcq(stem, key="right"):
+    return {"stem": stem, "key": key, "distractors": ["wrong 1", "wrong 2", "wrong 3"]}
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "quizzes.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO materials VALUES ('m1', 'uploads/m1.pdf')")
+    return path
+
+
+@pytest.fixture
+def repository(database):
+    return QuizRepository(lambda: sqlite3.connect(database, check_same_thread=False), placeholder="?")
+
+
+def questions(database, material_id="m1"):
+    with sqlite3.connect(database) as conn:
+        rows = conn.execute("SELECT question FROM quizzes WHERE materialID = ?", (material_id,)).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def test_placeholders_are_rewritten_for_the_driver(repository):
+    assert QuizRepository(None)._sql("a = %s AND b = %s") == "a = %s AND b = %s"
+    assert repository._sql("a = %s AND b = %s") == "a = ? AND b = ?"
+    # sqlite3 only accepts "?", so these only work if every %s was rewritten.
+    assert repository.get_material_path("m1") == "uploads/m1.pdf"
+    assert repository.get_material_path("missing") is None
+
+
+def test_replace_quizzes_swaps_the_whole_quiz(repository, database):
+    assert repository.replace_quizzes("m1", [mcq("old 1"), mcq("old 2")]) == 2
+    assert repository.replace_quizzes("m1", [mcq("new 1"), mcq("new 2"), mcq("new 3")]) == 3
+    assert questions(database) == ["new 1", "new 2", "new 3"]
+
+
+def test_replace_quizzes_skips_mcqs_without_four_options(repository, database):
+    short = {"stem": "short", "key": "right", "distractors": ["wrong"]}
+    assert repository.replace_quizzes("m1", [mcq("kept"), short]) == 1
+    assert questions(database) == ["kept"]
+
+
+def test_failed_replace_rolls_back_and_keeps_the_old_quiz(repository, database):
+    repository.replace_quizzes("m1", [mcq("old 1"), mcq("old 2")])
+
+    # The empty stem violates the CHECK constraint halfway through the insert.
+    with pytest.raises(sqlite3.IntegrityError):
+        repository.replace_quizzes("m1", [mcq("new 1"), mcq(""), mcq("new 3")])
+
+    assert questions(database) == ["old 1", "old 2"]
+
+
+def test_round_trips_are_counted(repository):
+    repository.get_material_path("m1")
+    assert repository.round_trips == 1
+    # Delete plus one executemany plus commit.
+    repository.replace_quizzes("m1", [mcq("a"), mcq("b")])
+    assert repository.round_trips == 4
+    # Nothing to insert: delete plus commit.
+    repository.replace_quizzes("m1", [])
+    assert repository.round_trips == 6
+    assert repository.stats() == {"round_trips": 6}
+
+
+class FakePool:
+    # Mimics mysql-connector: get_connection fails at once when exhausted.
+    def __init__(self, database, pool_size):
+        self.database = database
+        self.pool_size = pool_size
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        with self._lock:
+            if self.in_use == self.pool_size:
+                raise RuntimeError("Failed getting connection; pool exhausted")
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+        return PooledConnection(self)
+
+
+class PooledConnection:
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = sqlite3.connect(pool.database, check_same_thread=False)
+
+    def cursor(self):
+        # Slow enough that the callers overlap.
+        time.sleep(0.02)
+        return self._conn.cursor()
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+        with self._pool._lock:
+            self._pool.in_use -= 1
+
+
+def test_pool_checkouts_wait_instead_of_failing(database):
+    pool = FakePool(database, pool_size=2)
+    repository = QuizRepository.from_pool(pool, placeholder="?")
+    errors = []
+
+    def lookup():
+        try:
+            assert repository.get_material_path("m1") == "uploads/m1.pdf"
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert pool.peak == 2
+    assert pool.in_use == 0
+
+
+def test_pool_checkout_times_out(database):
+    repository = QuizRepository.from_pool(FakePool(database, pool_size=1), placeholder="?", checkout_timeout=0.05)
+    with repository._connection():
+        with pytest.raises(TimeoutError):
+            repository.get_material_path("m1")